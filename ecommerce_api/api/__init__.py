@@ -1,18 +1,46 @@
 import abc
+import hashlib
 import logging
+import time
+from datetime import timezone
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, json, jsonify, request, stream_with_context
 from flask_restful import Resource
-from sqlalchemy import inspect
+from sqlalchemy import and_, func, inspect, select
+from sqlalchemy.orm import load_only, selectinload
 from sqlalchemy.exc import IntegrityError
 from marshmallow import ValidationError
+from marshmallow.fields import Nested
+from werkzeug.http import http_date
+
+from ecommerce_api import cache, instrumentation, metrics, profiler, routing
+from ecommerce_api.api import count, cursor, serializer
+from ecommerce_api.config import Config
 
 LOGGER = logging.getLogger("crud-resource")
 
+NDJSON = 'application/x-ndjson'
+
+_COUNT_CACHE = count.CountCache(Config.COUNT_CACHE_TTL, Config.COUNT_CACHE_SIZE)
+
 def _unauthorized():
     return {'error': 'Unauthorized'}, 401
 
 
+def _item_id(value):
+    """
+    Id inteiro de um item das operações em lote (número ou string numérica),
+    ou None quando o valor não é um id.
+    """
+
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
 class CrudResource(Resource):
     """
     Resouce base que já disponibiliza um CRUD para determinado modelo.
@@ -96,6 +124,213 @@ class CrudResource(Resource):
 
         return result
 
+    def _fields_tree(self):
+        """
+        Converte o parametro `fields` da request em uma árvore de campos,
+        ex.: `id,coupons.code` -> {'id': {}, 'coupons': {'code': {}}}.
+        Retorna None quando todos os campos devem ser retornados.
+        """
+
+        if 'fields' not in request.args:
+            return None
+
+        tree = {}
+        for field in request.args.get('fields').split(','):
+            node = tree
+            for name in field.strip().split('.'):
+                if not name:
+                    break
+                node = node.setdefault(name, {})
+        return tree
+
+    def _only(self, schema, tree, prefix=''):
+        """
+        Caminhos do `only=` do marshmallow a partir da árvore de campos,
+        ignorando os campos que não existem no schema.
+        """
+
+        only = []
+        for name, subtree in tree.items():
+            field = schema.fields.get(name)
+            if field is None:
+                continue
+
+            if isinstance(field, Nested) and subtree:
+                only.extend(self._only(field.schema, subtree, prefix + name + '.'))
+            else:
+                only.append(prefix + name)
+        return only
+
+    def _dump_schema(self, method, **kwargs):
+        """
+        Schema utilizado para serializar a resposta, já restrito (`only=`) aos
+        campos pedidos no parametro `fields`.
+        """
+
+        schema = self._schema(method)
+
+        tree = self._fields_tree()
+        if tree is None:
+            return schema(**kwargs)
+
+        with profiler.span('fields'):
+            kwargs['only'] = self._only(schema(), tree)
+            return schema(**kwargs)
+
+    def _dump(self, schema, data):
+        """
+        Serializa a resposta das leituras, usando o serializador compilado
+        quando `COMPILED_SERIALIZER` está habilitado.
+        """
+
+        start = time.perf_counter()
+        try:
+            with profiler.span('dump'):
+                if Config.COMPILED_SERIALIZER:
+                    return serializer.dump(schema, data)
+                return schema.dump(data)
+        finally:
+            metrics.registry.observe(
+                metrics.SERIALIZATION, time.perf_counter() - start, resource=type(self).__name__
+            )
+
+    def _eager_load(self, query, schema, model=None, loader=None, deep=0):
+        """
+        Ajusta o carregamento da consulta aos campos que o schema vai serializar:
+        os relacionamentos são carregados em lote (selectin), evitando um SELECT
+        por registro no `schema.dump`, e quando o parametro `fields` é informado
+        as colunas que não serão serializadas ficam de fora do SELECT.
+        """
+
+        if not model:
+            model = self.model
+
+        mapper = model.__mapper__
+        relationships = mapper.relationships
+
+        if 'fields' in request.args:
+            columns = [
+                field.attribute or name for name, field in schema.fields.items()
+                if (field.attribute or name) in mapper.column_attrs
+            ]
+            # Necessários para o ETag/Last-Modified
+            columns.extend(name for name in ('created_at', 'updated_at') if name in mapper.column_attrs)
+            query = query.options(loader.load_only(*columns) if loader else load_only(*columns))
+
+        for name, field in schema.fields.items():
+            if not isinstance(field, Nested) or name not in relationships or deep >= 4:
+                continue
+
+            attribute = getattr(model, name)
+            nested_loader = loader.selectinload(attribute) if loader else selectinload(attribute)
+            query = query.options(nested_loader)
+            query = self._eager_load(
+                query, field.schema, relationships[name].mapper.class_, nested_loader, deep=deep+1
+            )
+
+        return query
+
+    def _validators(self, resources, schema, extra=()):
+        """
+        ETag forte e Last-Modified das representações, calculados a partir do `id`
+        e `updated_at` dos registros (e dos relacionamentos que serão serializados),
+        da máscara `fields` e de `extra` (ex.: dados do envelope da listagem).
+        Não precisa do `schema.dump`.
+        """
+
+        digest = hashlib.sha1()
+        digest.update(repr((self.model.__name__, request.args.get('fields'), extra)).encode('utf-8'))
+        last_modified = []
+
+        def stamp(resource, schema, deep=0):
+            modified = getattr(resource, 'updated_at', None) or getattr(resource, 'created_at', None)
+            if modified:
+                last_modified.append(modified)
+            digest.update(repr((resource.id, modified)).encode('utf-8'))
+
+            relationships = resource.__class__.__mapper__.relationships
+            for name, field in schema.fields.items():
+                if not isinstance(field, Nested) or name not in relationships or deep >= 4:
+                    continue
+
+                nested = getattr(resource, name)
+                nested = nested if isinstance(nested, list) else [nested] if nested else []
+                digest.update(repr((name, len(nested))).encode('utf-8'))
+                for item in nested:
+                    stamp(item, field.schema, deep=deep+1)
+
+        for resource in resources:
+            stamp(resource, schema)
+
+        return '"%s"' % digest.hexdigest(), max(last_modified) if last_modified else None
+
+    def _nested_keys(self, resource, schema, deep=0):
+        """
+        Chaves do cache de entidades dos registros aninhados que serão serializados.
+        """
+
+        keys = set()
+        relationships = resource.__class__.__mapper__.relationships
+        for name, field in schema.fields.items():
+            if not isinstance(field, Nested) or name not in relationships or deep >= 4:
+                continue
+
+            nested = getattr(resource, name)
+            for item in nested if isinstance(nested, list) else [nested] if nested else []:
+                keys.add(cache.entity_key(item))
+                keys.update(self._nested_keys(item, field.schema, deep=deep+1))
+        return keys
+
+    def _not_modified(self, etag, last_modified, use_modified_since=True):
+        """
+        Verifica `If-None-Match` e, na ausência dele, `If-Modified-Since`.
+        """
+
+        if request.if_none_match:
+            return request.if_none_match.contains_raw(etag) or request.if_none_match.star_tag
+
+        if use_modified_since and last_modified and request.if_modified_since:
+            return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+
+        return False
+
+    def _cache_headers(self, etag, last_modified):
+        headers = {'ETag': etag}
+        if last_modified:
+            headers['Last-Modified'] = http_date(last_modified.replace(tzinfo=timezone.utc))
+        return headers
+
+    def _to_many_order(self, model, nested_field, nested_schema, nested_order):
+        """
+        Ordenação por um campo de um relacionamento to-many (ex.: `coupons.code`).
+        Em vez do JOIN, que repete o registro para cada item do relacionamento,
+        ordena pelo menor (asc) ou maior (desc) valor entre os itens, com uma
+        subconsulta correlacionada que usa as chaves da tabela de associação
+        (`products_coupons`). Retorna None quando não se aplica.
+        """
+
+        relationship = model.__mapper__.relationships.get(nested_field)
+        field = nested_order.lstrip('-')
+        if relationship is None or not relationship.uselist or '.' in field:
+            return None
+
+        nested_model = relationship.mapper.class_
+        if not hasattr(nested_model, field) or field not in nested_schema.fields:
+            return None
+
+        desc = nested_order.startswith('-')
+        column = nested_model.__dict__[field]
+        condition = relationship.primaryjoin
+        if relationship.secondary is not None:
+            condition = and_(condition, relationship.secondaryjoin)
+
+        aggregate = select([func.max(column) if desc else func.min(column)]) \
+            .where(condition) \
+            .correlate(model.__table__) \
+            .as_scalar()
+
+        return aggregate.desc() if desc else aggregate.asc()
+
     def _define_search_order(self, query, schema, model=None, orders=None, deep=0):
         """
         Define a ordem da consulta baseado no parametro da request `order`.
@@ -124,6 +359,12 @@ class CrudResource(Resource):
                 if hasattr(model, nested_field) and nested_field in schema.fields:
                     try:
                         nested_model = inspect(model.__dict__[nested_field]).mapper.class_
+
+                        nested_order_by = self._to_many_order(model, nested_field, schema.fields[nested_field].schema, nested_orders[0])
+                        if nested_order_by is not None:
+                            order_by.append(nested_order_by)
+                            continue
+
                         if not nested_model in [c.entity for c in query._join_entities]:
                             query = query.join(model.__dict__[nested_field])
 
@@ -141,9 +382,124 @@ class CrudResource(Resource):
                         order_by.append(model.__dict__[field].asc())
         return query, order_by
 
+    def _count(self, query, mode):
+        """
+        Quantidade de registros da listagem de acordo com o parametro `count`:
+        `exact` executa o `count()`, `cached` reaproveita o resultado de uma consulta
+        igual feita há pouco, `estimate` usa as estatísticas da tabela e `none` não conta.
+        Retorna a quantidade e o modo que de fato a produziu.
+        """
+
+        if mode == 'none':
+            return None, mode
+
+        max_results = None
+        if request.args.get('max_results') and request.args.get('max_results').isnumeric():
+            max_results = int(request.args.get('max_results'))
+            query = query.limit(max_results)
+
+        if mode == 'estimate':
+            num_results = count.estimate(self.session, query, self.model)
+            if num_results is not None:
+                if max_results is not None:
+                    num_results = min(num_results, max_results)
+                return num_results, mode
+            mode = 'cached'
+
+        if mode == 'cached':
+            key = _COUNT_CACHE.key(query)
+            num_results = _COUNT_CACHE.get(key)
+            metrics.cache_lookup('count', num_results is not None)
+            if num_results is None:
+                num_results = query.count()
+                _COUNT_CACHE.set(key, num_results)
+            return num_results, mode
+
+        return query.count(), mode
+
+    def _seek_page(self, query, limit, values=None):
+        """
+        Paginação por cursor (keyset): em vez de `OFFSET`, posiciona a consulta
+        com um WHERE nas colunas da ordem a partir dos valores (`values`) da última
+        linha da página anterior. O `id` é adicionado ao final da ordem para desempate.
+        Retorna os registros e os valores da última linha, caso exista próxima página.
+        """
+
+        id_column = self.model.__table__.c.id
+        keys = cursor.order_keys(query._order_by or [])
+        if not any(id_column.shares_lineage(column) for column, desc in keys):
+            keys.append((id_column, False))
+
+        query = query.order_by(None).order_by(*[column.desc() if desc else column.asc() for column, desc in keys])
+
+        if values is not None:
+            cursor.check(keys, values)
+            query = query.filter(cursor.seek(keys, values))
+
+        rows = query.add_columns(*[column for column, desc in keys]).limit(limit + 1).all()
+
+        last_values = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_values = list(rows[-1][1:])
+
+        return [row[0] for row in rows], last_values
+
+    def _stream(self, query, schema, ndjson=False):
+        """
+        Listagem completa enviada aos poucos: os registros são lidos em lotes de
+        `STREAM_BATCH_SIZE` (paginação por cursor) e cada lote é serializado e enviado
+        assim que fica pronto, mantendo a memória constante independente do tamanho da tabela.
+        """
+
+        batch_size = Config.STREAM_BATCH_SIZE
+
+        def generate():
+            values = None
+            first = True
+
+            if not ndjson:
+                yield '{"objects": ['
+
+            while True:
+                results, values = self._seek_page(query, batch_size, values)
+                objects = self._dump(schema, results)
+                self._after_query(results, objects)
+
+                if ndjson:
+                    yield ''.join(json.dumps(obj) + '\n' for obj in objects)
+                elif objects:
+                    yield ('' if first else ',') + ','.join(json.dumps(obj) for obj in objects)
+                    first = False
+
+                if values is None:
+                    break
+
+            if not ndjson:
+                yield ']}\n'
+
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
     
+    def _cache_single(self):
+        """
+        Habilita o cache de entidades (`ecommerce_api.cache`) no `get_single`.
+        Com o cache, `_authorize_resource` e `_after_get` não são executados
+        quando a representação já está em cache, portanto só deve ser
+        habilitado para recursos que não dependem deles.
+        """
+        return False
+
     def _integrity_error_msg(self, resource, ex):
         return 'IntegrityError'
+
+    def _bulk_integrity_error_msg(self, resources, ex):
+        """
+        Mensagem das operações em lote: a violação não identifica o item.
+        """
+
+        return 'IntegrityError'
     
     def _authorize_resource(self, method, resource):
         return True
@@ -186,17 +542,275 @@ class CrudResource(Resource):
     @abc.abstractmethod
     def _after_delete(self, old_resource, result):
         return
+
+    def _before_bulk_post(self, resources):
+        """
+        Versão em lote do `_before_post`. Retorna as respostas de erro por índice.
+        """
+        errors = {}
+        for index, resource in enumerate(resources):
+            resp = self._before_post(resource)
+            if resp:
+                errors[index] = resp
+        return errors
+
+    def _before_bulk_patch(self, resources, old_resources):
+        errors = {}
+        for index, resource in enumerate(resources):
+            resp = self._before_patch(resource, old_resources[index])
+            if resp:
+                errors[index] = resp
+        return errors
+
+    def _before_bulk_delete(self, resources):
+        for resource in resources:
+            self._before_delete(resource)
+
+    def _after_bulk_post(self, resources, results):
+        for resource, result in zip(resources, results):
+            self._after_post(resource, result)
+
+    def _after_bulk_patch(self, resources, old_resources, results):
+        for resource, old_resource, result in zip(resources, old_resources, results):
+            self._after_patch(resource, old_resource, result)
+
+    def _after_bulk_delete(self, old_resources, results):
+        for old_resource, result in zip(old_resources, results):
+            self._after_delete(old_resource, result)
+
+    def _bulk_items(self, items):
+        if len(items) > Config.BULK_MAX_ITEMS:
+            return {'error': 'Maximum of %d items per request' % Config.BULK_MAX_ITEMS}, 400
+        return None
+
+    def _reload(self, resources, schema):
+        """
+        Recarrega os registros expirados pelo commit com uma única consulta (em vez
+        de um SELECT por registro no dump), já com os valores gravados durante o
+        commit (ex.: `effective_price` e `updated_at`).
+        """
+
+        # Pela identidade: ler `resource.id` de um registro expirado faria um SELECT por registro
+        ids = [inspect(resource).identity[0] for resource in resources]
+        if ids:
+            query = self.session.query(self.model).filter(self.model.id.in_(ids))
+            self._eager_load(query, schema).all()
+
+    def _bulk_post(self, items):
+        """
+        Criação em lote (POST com uma lista): todos os itens são validados de uma vez
+        e gravados em uma única transação. Se algum item for inválido nada é gravado
+        e os erros são retornados por índice.
+        """
+
+        resp = self._bulk_items(items)
+        if resp:
+            return resp
+
+        schema = self._schema('POST')(many=True)
+        schema.context = self
+
+        try:
+            with profiler.span('load'):
+                data = schema.load(items)
+        except ValidationError as err:
+            return {'errors': err.messages}, 400
+
+        resources = []
+        for item in data:
+            resource = self.model()
+            resource.__dict__.update(item)
+            resources.append(resource)
+
+        errors = self._before_bulk_post(resources)
+        if errors:
+            return {'errors': errors}, 400
+
+        for resource in resources:
+            if not self._authorize_resource('POST', resource):
+                return _unauthorized()
+
+        # O ORM envia um INSERT por registro para obter o id gerado (o MySQL não tem
+        # RETURNING), então os INSERTs repetidos não são reportados como N+1
+        try:
+            self.session.add_all(resources)
+            with instrumentation.batch():
+                self.session.commit()
+        except IntegrityError as ex:
+            self.session.rollback()
+            LOGGER.exception(ex)
+            return {'error': self._bulk_integrity_error_msg(resources, ex)}, 422
+
+        self._reload(resources, schema)
+        with profiler.span('dump'):
+            results = schema.dump(resources)
+
+        self._after_bulk_post(resources, results)
+
+        return {'objects': results}, 201
+
+    def _bulk_patch(self, items):
+        """
+        Atualização em lote (PATCH com uma lista de objetos com `id`).
+        Os registros são buscados com um único `IN`, todos os itens são validados
+        antes de qualquer alteração e os UPDATEs são enviados em um único flush.
+        """
+
+        resp = self._bulk_items(items)
+        if resp:
+            return resp
+
+        schema_class = self._schema('PATCH')
+        schema = schema_class(many=True)
+        schema.context = self
+        schema_fields = schema.fields
+
+        item_ids = [_item_id(item.get('id')) if isinstance(item, dict) else None for item in items]
+        ids = [id for id in item_ids if id is not None]
+        query = self.session.query(self.model).filter(self.model.id.in_(ids))
+        by_id = {resource.id: resource for resource in self._eager_load(query, schema)} if ids else {}
+
+        errors = {}
+        changes = []
+        load_schemas = {}
+        for index, (item, id) in enumerate(zip(items, item_ids)):
+            if id is None:
+                errors[index] = 'Bad request'
+                continue
+
+            resource = by_id.get(id)
+            if not resource:
+                errors[index] = 'Resource not found'
+                continue
+
+            patch = {key: value for key, value in item.items() if key != 'id'}
+            if any(key not in schema_fields or schema_fields[key].dump_only for key in patch):
+                errors[index] = 'Bad request'
+                continue
+
+            keys = tuple(sorted(patch))
+            if keys not in load_schemas:
+                load_schemas[keys] = schema_class(only=keys)
+
+            try:
+                with profiler.span('load'):
+                    changes.append((resource, load_schemas[keys].load(patch)))
+            except ValidationError as err:
+                errors[index] = err.messages
+
+        if errors:
+            return {'errors': errors}, 400
+
+        resources = [resource for resource, data in changes]
+        old_resources = [self._to_dict(resource) for resource in resources]
+
+        for resource, data in changes:
+            for attr in data:
+                if hasattr(resource, attr):
+                    setattr(resource, attr, data[attr])
+
+        errors = self._before_bulk_patch(resources, old_resources)
+        if errors:
+            self.session.rollback()
+            return {'errors': errors}, 400
+
+        for resource in resources:
+            if not self._authorize_resource('PATCH', resource):
+                self.session.rollback()
+                return _unauthorized()
+
+        try:
+            self.session.commit()
+        except IntegrityError as ex:
+            self.session.rollback()
+            return {'error': self._bulk_integrity_error_msg(resources, ex)}, 422
+
+        self._reload(resources, schema)
+        with profiler.span('dump'):
+            results = schema.dump(resources)
+
+        self._after_bulk_patch(resources, old_resources, results)
+
+        return {'objects': results}, 200
+
+    def _bulk_delete(self, ids):
+        """
+        Remoção em lote pela lista de ids (`?ids=1,2,3` ou corpo `[1, 2, 3]`).
+        As associações das tabelas secundárias (ex.: `products_coupons`) e os registros
+        são removidos com um DELETE ... IN cada, na mesma transação. Como nas demais
+        operações em lote, os erros são retornados pelo índice do item na lista.
+        """
+
+        resp = self._bulk_items(ids)
+        if resp:
+            return resp
+
+        errors = {index: 'Bad request' for index, id in enumerate(ids) if _item_id(id) is None}
+        if errors:
+            return {'errors': errors}, 400
+        ids = [_item_id(id) for id in ids]
+
+        schema = self._schema('DELETE')(many=True)
+        schema.context = self
+
+        query = self.session.query(self.model).filter(self.model.id.in_(ids))
+        resources = self._eager_load(query, schema).all()
+
+        found = {resource.id for resource in resources}
+        errors = {index: 'Resource not found' for index, id in enumerate(ids) if id not in found}
+        if errors:
+            return {'errors': errors}, 404
+
+        self._before_bulk_delete(resources)
+
+        for resource in resources:
+            if not self._authorize_resource('DELETE', resource):
+                return _unauthorized()
+
+        results = schema.dump(resources)
+        ids = [resource.id for resource in resources]
+
+        changed = set(cache.entity_key(resource) for resource in resources)
+        for relationship in self.model.__mapper__.relationships:
+            for item in resources:
+                related = getattr(item, relationship.key)
+                for value in related if isinstance(related, list) else [related] if related else []:
+                    changed.add(cache.entity_key(value))
+
+            if relationship.secondary is not None:
+                for parent_column, secondary_column in relationship.synchronize_pairs:
+                    self.session.execute(
+                        relationship.secondary.delete().where(secondary_column.in_(ids))
+                    )
+
+        table = self.model.__table__
+        self.session.execute(table.delete().where(table.c.id.in_(ids)))
+        for resource in resources:
+            self.session.expunge(resource)
+
+        cache.mark_changed(self.session(), changed)
+        self.session.commit()
+
+        self._after_bulk_delete(resources, results)
+
+        return {'objects': results}
+
     
     def post(self):
         methods = self._methods()
         if not methods.get('POST') is True:
             return _unauthorized()
 
+        payload = request.get_json(silent=True) or {}
+        if isinstance(payload, list):
+            return self._bulk_post(payload)
+
         schema = self._schema('POST')()
         schema.context = self
 
         try:
-            data = schema.load(request.get_json(silent=True) or {})
+            with profiler.span('load'):
+                data = schema.load(payload)
         except ValidationError as err:
             return err.messages, 400
 
@@ -218,7 +832,8 @@ class CrudResource(Resource):
             LOGGER.exception(ex)
             return {'error': self._integrity_error_msg(resource, ex)}, 422
 
-        result = schema.dump(resource)
+        with profiler.span('dump'):
+            result = schema.dump(resource)
 
         self._after_post(resource, result)
 
@@ -230,6 +845,9 @@ class CrudResource(Resource):
             return _unauthorized()
 
         if not id:
+            patch = request.get_json(silent=True)
+            if isinstance(patch, list):
+                return self._bulk_patch(patch)
             return 'Bad request', 400
 
         resource = None
@@ -258,7 +876,8 @@ class CrudResource(Resource):
                 return 'Bad request', 400
 
         try:
-            data = load_schema.load(patch)
+            with profiler.span('load'):
+                data = load_schema.load(patch)
         except ValidationError as err:
             return err.messages, 400
 
@@ -281,7 +900,8 @@ class CrudResource(Resource):
             self.session.rollback()
             return {'error': self._integrity_error_msg(resource, ex)}, 422
 
-        result = schema.dump(resource)
+        with profiler.span('dump'):
+            result = schema.dump(resource)
 
         self._after_patch(resource, old_resource, result)
 
@@ -320,14 +940,51 @@ class CrudResource(Resource):
             self._after_delete(resource, result)
             return result
 
+        if 'ids' in request.args:
+            ids = [id.strip() for id in request.args.get('ids').split(',') if id.strip()]
+        else:
+            ids = request.get_json(silent=True)
+
+        if not isinstance(ids, list) or not ids:
+            return 'Bad request', 400
+
+        return self._bulk_delete(ids)
+
     def get_single(self, id):
         methods = self._methods()
         if not methods.get('GET') is True:
             return _unauthorized()
         resource = None
 
+        # Id canônico: a chave do cache deve ser a mesma do `cache.entity_key`
+        # usada nas invalidações (ex.: `/product/01` e `/product/1`)
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            return 'Resource not found', 404
+
+        use_cache = self._cache_single()
+        key = (self.model.__table__.name, str(id))
+        variant = request.args.get('fields', '')
+
+        if use_cache and id:
+            cached = cache.entity_cache.get(key, variant)
+            metrics.cache_lookup('entity', bool(cached))
+            if cached:
+                result, etag, last_modified = cached
+                headers = self._cache_headers(etag, last_modified)
+                if self._not_modified(etag, last_modified):
+                    return Response(status=304, headers=headers)
+                return result, 200, headers
+
+        generation = cache.entity_cache.generation() if use_cache else None
+
         if id:
-            resource = self.session.query(self.model).filter(self.model.id == id).first()
+            schema = self._dump_schema('GET')
+            query = self.session.query(self.model).filter(self.model.id == id)
+            query = self._eager_load(query, schema)
+            with profiler.span('db.query'):
+                resource = query.first()
 
         if not resource:
             return 'Resource not found', 404
@@ -335,13 +992,22 @@ class CrudResource(Resource):
         if not self._authorize_resource('GET', resource):
             return _unauthorized()
 
-        schema = self._schema('GET')
+        etag, last_modified = self._validators([resource], schema)
+        headers = self._cache_headers(etag, last_modified)
+        if self._not_modified(etag, last_modified):
+            return Response(status=304, headers=headers)
 
-        result = schema().dump(resource)
+        result = self._dump(schema, resource)
 
         self._after_get(resource, result)
 
-        return self._remove_fields(result)
+        if use_cache and routing.may_cache(self.session):
+            cache.entity_cache.set(
+                key, variant, (result, etag, last_modified),
+                depends_on=self._nested_keys(resource, schema), generation=generation
+            )
+
+        return result, 200, headers
 
     def query(self):
         methods = self._methods()
@@ -350,26 +1016,42 @@ class CrudResource(Resource):
 
         schema = self._schema('QUERY')(many=True)
         schema.context = self
+        dump_schema = self._dump_schema('QUERY', many=True)
+        dump_schema.context = self
 
         query = self.session.query(self.model)
         query = self._make_query(query)
+        query = self._eager_load(query, dump_schema)
+
+        ndjson = request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+        if ndjson or request.args.get('stream') in ('1', 'true'):
+            if not query._order_by:
+                query, order_by = self._define_search_order(query, schema)
+                query = query.order_by(*order_by)
+
+            return self._stream(query, dump_schema, ndjson)
 
         # Paginação
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
+        num_results = None
+        next_cursor = None
+
+        count_mode = request.args.get('count', 'exact')
+        if count_mode not in count.COUNT_MODES:
+            return 'Bad request', 400
 
         if not limit == 0:
-            if request.args.get('max_results') and request.args.get('max_results').isnumeric():
-                max_results = int(request.args.get('max_results'))
-                num_results = query.limit(max_results).count()
-            else:
-                num_results = query.count()
+            with profiler.span('db.count'):
+                num_results, count_mode = self._count(query, count_mode)
 
-            total_pages = (num_results // limit) if num_results > 0 else 0
-            if total_pages > 0 and (num_results % limit) > 0:
-                total_pages += 1
-            elif total_pages == 0:
-                total_pages = 1
+            total_pages = None
+            if num_results is not None:
+                total_pages = (num_results // limit) if num_results > 0 else 0
+                if total_pages > 0 and (num_results % limit) > 0:
+                    total_pages += 1
+                elif total_pages == 0:
+                    total_pages = 1
 
             if not query._order_by:
                 query, order_by = self._define_search_order(query, schema)
@@ -377,26 +1059,60 @@ class CrudResource(Resource):
                 if order_by:
                     query = query.order_by(*order_by)
 
-            results = query.limit(limit).offset((page - 1) * limit).all()
+            if 'cursor' in request.args:
+                order = request.args.get('order', '')
+                try:
+                    values = cursor.decode(order, request.args['cursor']) if request.args['cursor'] else None
+                    with profiler.span('db.query'):
+                        results, last_values = self._seek_page(query, limit, values)
+                except cursor.InvalidCursor:
+                    return 'Bad request', 400
+
+                if last_values is not None:
+                    next_cursor = cursor.encode(order, last_values)
+            else:
+                with profiler.span('db.query'):
+                    results = query.limit(limit).offset((page - 1) * limit).all()
         else:
-            results = query.all()
+            with profiler.span('db.query'):
+                results = query.all()
+
+        # A remoção de registros não altera o `updated_at` dos demais, por isso
+        # a listagem só responde 304 pelo ETag, que inclui os parâmetros e o envelope.
+        envelope = (sorted(request.args.items(multi=True)), num_results, next_cursor)
+        etag, last_modified = self._validators(results, dump_schema, envelope)
+        headers = self._cache_headers(etag, last_modified)
+        if self._not_modified(etag, last_modified, use_modified_since=False):
+            return Response(status=304, headers=headers)
 
-        objects = schema.dump(results)
-        objects = self._remove_fields(objects)
+        objects = self._dump(dump_schema, results)
 
         self._after_query(results, objects)
 
-        if limit == 0:
-            return jsonify({
-                'objects': objects,
-            })
-
-        return jsonify({
-            'objects': objects,
-            'page': page,
-            'num_results': num_results,
-            'total_pages': total_pages
-        })
+        with profiler.span('jsonify'):
+            if limit == 0:
+                response = jsonify({
+                    'objects': objects,
+                })
+            elif 'cursor' in request.args:
+                response = jsonify({
+                    'objects': objects,
+                    'next_cursor': next_cursor,
+                    'num_results': num_results,
+                    'total_pages': total_pages,
+                    'count': count_mode
+                })
+            else:
+                response = jsonify({
+                    'objects': objects,
+                    'page': page,
+                    'num_results': num_results,
+                    'total_pages': total_pages,
+                    'count': count_mode
+                })
+
+        response.headers.extend(headers)
+        return response
 
     def get(self, id=None):
         if id:
@@ -1,29 +1,79 @@
+import hashlib
 import jwt
 import logging
-from flask import request, jsonify
+import time
+from flask import g, request, jsonify
 from functools import wraps
 
+from ecommerce_api import metrics
 from ecommerce_api.config import Config
+from ecommerce_api.lru import LRUCache
 
 LOGGER = logging.getLogger(__name__)
 
 
-def get_auth_data():
+class _VerifiedTokens():
     """
-    Verifica se tem usuario atenticado de acordo com o tipo de autenticação.
-    :return:
+    LRU dos tokens já verificados, indexado pelo digest do token.
+    A entrada expira no `exp` do token ou após `AUTH_TOKEN_CACHE_TTL`.
+    """
+
+    def __init__(self, size=10000, ttl=300):
+        self.ttl = ttl
+        self.__items = LRUCache(size, clock=time.time)
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, key):
+        payload = self.__items.get(key)
+        return dict(payload) if payload is not None else None
+
+    def set(self, key, payload):
+        now = time.time()
+        if payload.get('nbf', now) > now:
+            return
+
+        expires = now + self.ttl
+        if isinstance(payload.get('exp'), (int, float)):
+            expires = min(expires, payload['exp'])
+
+        self.__items.set(key, dict(payload), expires=expires)
+
+
+_VERIFIED_TOKENS = _VerifiedTokens(Config.AUTH_TOKEN_CACHE_SIZE, Config.AUTH_TOKEN_CACHE_TTL)
+_NOT_LOADED = object()
+
+
+def reset_auth_context():
+    """
+    Registrado como `before_request`: o `g` pertence ao contexto da aplicação,
+    que pode ser compartilhado entre requests, então o resultado é limpo a cada request.
     """
+    g._auth_data = _NOT_LOADED
+
+
+def _decode_auth_data():
     authorization = request.headers.get('authorization')
     if not authorization:
         return None
     token = authorization.split(' ')
-    if token[0] != 'Bearer':
+    if len(token) != 2 or token[0] != 'Bearer':
       return None
 
+    key = _VERIFIED_TOKENS.key(token[1])
+    user = _VERIFIED_TOKENS.get(key)
+    metrics.cache_lookup('auth_token', user is not None)
+
     auth_data = {}
     try:
         # User authentication
-        auth_data['user'] = jwt.decode(token[1], Config.SECRET_KEY)
+        if user is None:
+            user = jwt.decode(token[1], Config.SECRET_KEY)
+            _VERIFIED_TOKENS.set(key, user)
+
+        auth_data['user'] = user
         auth_data['type'] = 'user'
         
         return auth_data
@@ -32,6 +82,19 @@ def get_auth_data():
         return None
 
 
+def get_auth_data():
+    """
+    Verifica se tem usuario atenticado de acordo com o tipo de autenticação.
+    O token é decodificado no máximo uma vez por request.
+    :return:
+    """
+    auth_data = g.get('_auth_data', _NOT_LOADED)
+    if auth_data is _NOT_LOADED:
+        auth_data = _decode_auth_data()
+        g._auth_data = auth_data
+    return auth_data
+
+
 def auth_required(*args, **kwargs):
   """
   Decorator que verifica o token de autenticação informado na requisição.
@@ -0,0 +1,145 @@
+"""
+Bulkheads por classe de endpoint (leituras, escritas, actions e login).
+
+Cada classe tem um limite de requests simultâneas e uma fila de espera limitada,
+assim uma classe saturada não consome todas as conexões do pool do SQLAlchemy.
+As consultas de actions de alto volume (blueprints com sufixo `lookup`, ex.: cupom
+por código) entram no bulkhead das leituras.
+Requests acima da fila, ou que esperam mais que o `timeout`, são rejeitadas
+imediatamente. Os limites valem por processo.
+"""
+import threading
+import time
+
+from flask import g, jsonify, request
+
+from ecommerce_api.config import Config
+
+READ = 'read'
+WRITE = 'write'
+ACTIONS = 'actions'
+LOGIN = 'login'
+
+_READ_METHODS = ('GET', 'HEAD')
+
+
+class Rejected(Exception):
+    pass
+
+
+class Bulkhead():
+    def __init__(self, name, limit, queue=0, timeout=1, status=503):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.status = status
+        self.__in_flight = 0
+        self.__queued = 0
+        self.__rejected = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self):
+        with self.__condition:
+            if self.__in_flight < self.limit:
+                self.__in_flight += 1
+                return
+
+            if self.__queued >= self.queue:
+                self.__rejected += 1
+                raise Rejected(self.name)
+
+            self.__queued += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while self.__in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.__rejected += 1
+                        raise Rejected(self.name)
+                    self.__condition.wait(remaining)
+
+                self.__in_flight += 1
+            finally:
+                self.__queued -= 1
+
+    def release(self):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify()
+
+    def stats(self):
+        with self.__condition:
+            return {
+                'limit': self.limit,
+                'queue': self.queue,
+                'in_flight': self.__in_flight,
+                'queued': self.__queued,
+                'rejected': self.__rejected,
+            }
+
+
+BULKHEADS = {name: Bulkhead(name, **options) for name, options in Config.BULKHEADS.items()}
+
+
+def classify():
+    """
+    Classe do endpoint da request atual ou None quando não é limitado.
+    """
+
+    if request.method == 'OPTIONS' or request.url_rule is None:
+        return None
+
+    if request.blueprint == 'iam':
+        return LOGIN
+
+    if request.blueprint is not None:
+        if request.blueprint.endswith('_action_%s' % Config.VERSION):
+            return ACTIONS
+        # Consultas das actions (ex.: cupom por código) usam o mesmo limite das leituras
+        if request.blueprint.endswith('_lookup_%s' % Config.VERSION):
+            return READ
+        return None
+
+    # Recursos do flask-restful (registrados diretamente na aplicação)
+    if not request.url_rule.rule.startswith('/%s/' % Config.VERSION):
+        return None
+
+    return READ if request.method in _READ_METHODS else WRITE
+
+
+def admit():
+    """
+    Registrado como `before_request`.
+    """
+
+    g._bulkhead = None
+
+    bulkhead = BULKHEADS.get(classify())
+    if bulkhead is None:
+        return None
+
+    try:
+        bulkhead.acquire()
+    except Rejected:
+        response = jsonify({'error': 'Too many requests', 'bulkhead': bulkhead.name})
+        response.status_code = bulkhead.status
+        response.headers['Retry-After'] = str(max(1, int(bulkhead.timeout)))
+        return response
+
+    g._bulkhead = bulkhead
+    return None
+
+
+def release(exception=None):
+    """
+    Registrado como `teardown_request`.
+    """
+
+    bulkhead = g.pop('_bulkhead', None)
+    if bulkhead is not None:
+        bulkhead.release()
+
+
+def stats():
+    return {name: bulkhead.stats() for name, bulkhead in BULKHEADS.items()}
@@ -0,0 +1,49 @@
+from sqlalchemy import text
+
+from ecommerce_api.lru import LRUCache
+
+COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+
+
+class CountCache():
+    """Cache com TTL curto para os `count()` das listagens,
+    indexado pelo SQL normalizado da consulta e seus parâmetros.
+    """
+
+    def __init__(self, ttl=10, size=1024):
+        self.__items = LRUCache(size, ttl)
+
+    @staticmethod
+    def key(query):
+        statement = query.statement.compile()
+        params = sorted((k, repr(v)) for k, v in statement.params.items())
+        return str(statement), tuple(params)
+
+    def get(self, key):
+        return self.__items.get(key)
+
+    def set(self, key, value):
+        self.__items.set(key, value)
+
+
+def estimate(session, query, model):
+    """Estimativa da quantidade de registros a partir das estatísticas da tabela.
+    Só é possível para consultas sem filtro no MySQL, nos demais casos retorna None.
+    """
+
+    if query.whereclause is not None:
+        return None
+
+    bind = session.get_bind()
+    if bind.dialect.name != 'mysql':
+        return None
+
+    rows = session.execute(
+        text(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'
+        ),
+        {'table': model.__table__.name}
+    ).scalar()
+
+    return int(rows) if rows is not None else None
@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, false, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+
+class InvalidCursor(Exception):
+    """O cursor informado na request não pode ser decodificado."""
+
+
+def order_keys(order_by):
+    """
+    Converte as expressões de `order_by` em uma lista de (coluna, desc).
+    """
+
+    keys = []
+    for expr in order_by:
+        if isinstance(expr, UnaryExpression):
+            keys.append((expr.element, expr.modifier is operators.desc_op))
+        else:
+            keys.append((expr, False))
+    return keys
+
+
+_SCALARS = (bool, int, float, str)
+_NUMBERS = (int, float, Decimal)
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise InvalidCursor()
+    if value is not None and not isinstance(value, _SCALARS):
+        raise InvalidCursor()
+    return value
+
+
+def encode(order, values):
+    """
+    Gera o cursor opaco com a ordem utilizada e os valores da última linha.
+    """
+
+    payload = json.dumps({'o': order, 'v': [_dump_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode(order, cursor):
+    """
+    Retorna os valores do cursor, validando se foi gerado para a mesma ordem.
+    """
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(payload, dict) or not isinstance(payload.get('v'), list):
+            raise InvalidCursor()
+        values = [_load_value(v) for v in payload['v']]
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        raise InvalidCursor()
+
+    if payload.get('o') != order:
+        raise InvalidCursor()
+
+    return values
+
+
+def check(keys, values):
+    """
+    Valida os valores do cursor com os tipos das colunas da ordem.
+    Expressões sem tipo Python conhecido (ex.: subconsultas) não são verificadas.
+    """
+
+    if len(values) != len(keys):
+        raise InvalidCursor()
+
+    for (column, desc), value in zip(keys, values):
+        if value is None:
+            continue
+
+        try:
+            expected = column.type.python_type
+        except (AttributeError, NotImplementedError):
+            continue
+
+        if expected in _NUMBERS:
+            valid = isinstance(value, _NUMBERS) and not isinstance(value, bool)
+        elif expected is date:
+            valid = isinstance(value, date) and not isinstance(value, datetime)
+        else:
+            valid = isinstance(value, expected)
+
+        if not valid:
+            raise InvalidCursor()
+
+
+def _after(column, desc, value):
+    """
+    Condição para as linhas que vêm depois de `value` na coluna.
+    Segue a ordenação do MySQL, onde NULL é o menor valor.
+    """
+
+    if value is None:
+        return None if desc else column.isnot(None)
+    if desc:
+        return or_(column < value, column.is_(None))
+    return column > value
+
+
+def _equal(column, value):
+    if value is None:
+        return column.is_(None)
+    return column == value
+
+
+def seek(keys, values):
+    """
+    Monta o WHERE que posiciona a consulta logo após a linha do cursor:
+    (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...
+    """
+
+    clauses = []
+    equals = []
+    for (column, desc), value in zip(keys, values):
+        after = _after(column, desc, value)
+        if after is not None:
+            clauses.append(and_(*equals, after))
+        equals.append(_equal(column, value))
+
+    if not clauses:
+        return false()
+
+    return or_(*clauses)
@@ -1,10 +1,12 @@
 import logging
+from datetime import datetime
 from flask_cors import cross_origin
 from flask import request, jsonify
 from marshmallow import ValidationError
 from sqlalchemy.exc import IntegrityError
 
-from ecommerce_api.model.product import Product
+from ecommerce_api import cache
+from ecommerce_api.model.product import Product, products_coupons
 from ecommerce_api.model.coupon import Coupon
 from ecommerce_api.api.rest.schema import product, coupon
 from ecommerce_api.resources import db
@@ -14,6 +16,23 @@ from ecommerce_api.api.auth import auth_required
 actions = create_api_blueprint('attach', 'action', 'v1')
 LOGGER = logging.getLogger(__name__)
 
+
+def _ids(items):
+  """Ids inteiros (sem repetição) dos itens, ou None quando algum
+  item não tem um id numérico"""
+
+  ids = set()
+  for item in items or []:
+    id = item.get('id') if isinstance(item, dict) else None
+    if isinstance(id, bool) or not isinstance(id, (int, str)):
+      return None
+    try:
+      ids.add(int(id))
+    except ValueError:
+      return None
+  return sorted(ids)
+
+
 @actions.route('/coupons', methods=['POST'])
 @cross_origin()
 @auth_required()
@@ -21,32 +40,69 @@ def _attach(auth_data=None):
   """Action to create the relations
   with product and coupons
 
+  The coupons informed become the coupons of each product
+  (`product` or a list in `products`). Only the differences
+  to the current relations are inserted or deleted.
+
   Args:
       auth_data ([type], optional): [description]. Defaults to None.
 
   Returns:
       str: operations message
   """
-  _request = request.get_json(silent=True)
-  _product = _request.get('product' or None)
-
-  if _product:
-    _coupons = _request.get('coupons' or None)
-
-    product_ = Product.query.filter(Product.id == _product['id']).first()
-    product_.coupons.clear()
-    for c in _coupons:
-      coupon_ = Coupon.query.filter(Coupon.id == c['id']).first()
-      if coupon_:
-        product_.coupons.append(coupon_)
-    
-    try:
-      db.session.add(product_)
-      db.session.commit()
-    except IntegrityError as ex:
-      db.session.rollback()
-      LOGGER.exception(ex)
-      return {'error': ex}, 422
-    
+  _request = request.get_json(silent=True) or {}
+  _products = _request.get('products') or ([_request['product']] if _request.get('product') else [])
+
+  product_ids = _ids(_products)
+  coupon_ids = _ids(_request.get('coupons'))
+  if not product_ids or coupon_ids is None:
+    return 'Bad request', 400
+
+  found_products = {id for id, in db.session.query(Product.id).filter(Product.id.in_(product_ids))}
+  if len(found_products) != len(product_ids):
+    return {'error': 'Product not found', 'ids': [id for id in product_ids if id not in found_products]}, 404
 
+  if coupon_ids:
+    coupon_ids = {id for id, in db.session.query(Coupon.id).filter(Coupon.id.in_(coupon_ids))}
+
+  current = set(
+    db.session.query(products_coupons.c.product_id, products_coupons.c.coupon_id)
+    .filter(products_coupons.c.product_id.in_(product_ids))
+  )
+  to_insert = [
+    {'product_id': product_id, 'coupon_id': coupon_id}
+    for product_id in product_ids for coupon_id in coupon_ids
+    if (product_id, coupon_id) not in current
+  ]
+  to_delete = [(product_id, coupon_id) for product_id, coupon_id in current if coupon_id not in coupon_ids]
+
+  if not to_insert and not to_delete:
     return 'success', 200
+
+  changed_products = {row['product_id'] for row in to_insert} | {product_id for product_id, _ in to_delete}
+  changed_coupons = {row['coupon_id'] for row in to_insert} | {coupon_id for _, coupon_id in to_delete}
+
+  try:
+    if to_delete:
+      delete = products_coupons.delete().where(products_coupons.c.product_id.in_(changed_products))
+      if coupon_ids:
+        delete = delete.where(products_coupons.c.coupon_id.notin_(coupon_ids))
+      db.session.execute(delete)
+
+    if to_insert:
+      db.session.execute(products_coupons.insert(), to_insert)
+
+    # As alterações não passam pelo ORM, então o `updated_at` e
+    # o cache de entidades são atualizados aqui.
+    now = datetime.utcnow()
+    for model, ids in ((Product, changed_products), (Coupon, changed_coupons)):
+      db.session.execute(model.__table__.update().where(model.__table__.c.id.in_(ids)).values(updated_at=now))
+      cache.mark_changed(db.session(), [(model.__table__.name, str(id)) for id in ids])
+
+    db.session.commit()
+  except IntegrityError as ex:
+    db.session.rollback()
+    LOGGER.exception(ex)
+    return {'error': str(ex)}, 422
+
+  return 'success', 200
@@ -0,0 +1,24 @@
+from flask_cors import cross_origin
+
+from ecommerce_api.api import bulkhead
+from ecommerce_api.utils import create_api_blueprint
+from ecommerce_api.api.auth import auth_required
+
+# Não é uma action (sufixo 'status'), então não passa pelos bulkheads
+status = create_api_blueprint('bulkheads', 'status', 'v1')
+
+
+@status.route('', methods=['GET'])
+@cross_origin()
+@auth_required()
+def _bulkheads(auth_data=None):
+  """Requests em execução e na fila de cada bulkhead
+  deste processo
+
+  Args:
+      auth_data ([type], optional): [description]. Defaults to None.
+
+  Returns:
+      dict: estatísticas por bulkhead
+  """
+  return bulkhead.stats(), 200
@@ -0,0 +1,71 @@
+from flask_cors import cross_origin
+from flask import request
+
+from ecommerce_api import pricing
+from ecommerce_api.config import Config
+from ecommerce_api.resources import db
+from ecommerce_api.utils import create_api_blueprint
+from ecommerce_api.api.auth import auth_required
+
+actions = create_api_blueprint('cart', 'action', 'v1')
+
+
+def _integer(value):
+  """Inteiro de um número ou string numérica, ou None (inclusive para bool e float)"""
+
+  if isinstance(value, bool) or not isinstance(value, (int, str)):
+    return None
+  try:
+    return int(value)
+  except ValueError:
+    return None
+
+
+def _items(items):
+  """Lista de (product id, quantidade), somando as quantidades de ids repetidos"""
+
+  quantities = {}
+  for item in items:
+    if not isinstance(item, dict):
+      return None
+    id, quantity = _integer(item.get('id')), _integer(item.get('quantity', 1))
+    if id is None or quantity is None or quantity <= 0:
+      return None
+    quantities[id] = quantities.get(id, 0) + quantity
+  return list(quantities.items())
+
+
+@actions.route('/price', methods=['POST'])
+@cross_origin()
+@auth_required()
+def _price(auth_data=None):
+  """Action to price a cart
+
+  Receives `items` (list of `{"id": product id, "quantity": n}`)
+  and, optionally, `coupons` (list of codes). Each line gets the
+  best discount among the coupons of the product, restricted to
+  the informed codes.
+
+  Args:
+      auth_data ([type], optional): [description]. Defaults to None.
+
+  Returns:
+      dict: lines, subtotal, discount and total
+  """
+  _request = request.get_json(silent=True) or {}
+  _items_request = _request.get('items')
+  codes = _request.get('coupons')
+
+  if not isinstance(_items_request, list) or not _items_request or len(_items_request) > Config.BULK_MAX_ITEMS:
+    return 'Bad request', 400
+  if codes is not None and (not isinstance(codes, list) or not all(isinstance(code, str) for code in codes)):
+    return 'Bad request', 400
+
+  items = _items(_items_request)
+  if items is None:
+    return 'Bad request', 400
+
+  try:
+    return pricing.index.price(db.session, items, codes), 200
+  except KeyError as ex:
+    return {'error': 'Product not found', 'ids': ex.args[0]}, 404
@@ -0,0 +1,46 @@
+from flask_cors import cross_origin
+
+from ecommerce_api import metrics, routing
+from ecommerce_api.coupon_codes import codes
+from ecommerce_api.model import Coupon
+from ecommerce_api.resources import db
+from ecommerce_api.utils import create_api_blueprint
+from ecommerce_api.api.auth import auth_required
+from ecommerce_api.api.rest.schema.coupon import CouponSchema
+
+# Consulta de alto volume: sufixo 'lookup', limitada pelo bulkhead das leituras
+actions = create_api_blueprint('coupon', 'lookup', 'v1')
+
+_SCHEMA = CouponSchema(exclude=('products',))
+
+
+@actions.route('/by-code/<code>', methods=['GET'])
+@cross_origin()
+@auth_required()
+def _by_code(code, auth_data=None):
+  """Action to find a coupon by its code
+
+  Known and unknown codes are cached in the process.
+
+  Args:
+      code (str): coupon code
+      auth_data ([type], optional): [description]. Defaults to None.
+
+  Returns:
+      dict: the coupon (without the products)
+  """
+  cached, result = codes.get(code)
+  metrics.cache_lookup('coupon_code', cached)
+
+  if not cached:
+    generation = codes.generation()
+    coupon = db.session.query(Coupon).filter(Coupon.code == code).one_or_none()
+    result = _SCHEMA.dump(coupon) if coupon is not None else None
+
+    if routing.may_cache(db.session):
+      codes.set(code, coupon.id if coupon is not None else None, result, generation=generation)
+
+  if result is None:
+    return {'error': 'Coupon not found'}, 404
+
+  return result, 200
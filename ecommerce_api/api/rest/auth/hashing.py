@@ -0,0 +1,85 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+SCHEMES = ['bcrypt', 'des_crypt', 'pbkdf2_sha256', 'pbkdf2_sha512', 'sha256_crypt', 'sha512_crypt', 'plaintext']
+DEFAULT_SCHEME = 'sha512_crypt'
+
+_CONTEXT = None
+
+
+def crypt_context():
+  global _CONTEXT
+  if _CONTEXT is None:
+    _CONTEXT = CryptContext(schemes=SCHEMES, default=DEFAULT_SCHEME, deprecated=['auto'])
+  return _CONTEXT
+
+
+def verify_and_update(secret, hash):
+  """Executado nos processos do pool"""
+  return crypt_context().verify_and_update(secret, hash)
+
+
+def hash_password(secret):
+  """Executado nos processos do pool"""
+  return crypt_context().hash(secret)
+
+
+class Overloaded(Exception):
+  """A fila do pool de hash está cheia"""
+
+
+class PasswordHasher():
+  """Pool de processos dedicado às funções de hash de senha, que são caras em CPU
+  e não devem ocupar as threads que atendem as requests.
+
+  No máximo `workers + queue_depth` tarefas ficam pendentes; acima disso
+  `submit` falha imediatamente com `Overloaded`. Com `timeout`, a tarefa também
+  é recusada de imediato quando as pendentes, a `cost` segundos cada, não
+  terminariam a tempo (em vez de a request esperar até o timeout).
+  """
+
+  def __init__(self, workers=2, queue_depth=16, cost=1.0):
+    self.workers = workers
+    self.queue_depth = queue_depth
+    self.cost = cost
+    self.__executor = None
+    self.__pid = None
+    self.__pending = 0
+    self.__lock = threading.Lock()
+
+  def __ensure(self):
+    # O pool é criado no processo que o utiliza (ex.: após o fork dos workers)
+    if self.__pid == os.getpid():
+      return
+
+    with self.__lock:
+      if self.__pid != os.getpid():
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.__pending = 0
+        self.__pid = os.getpid()
+
+  def submit(self, fn, *args, timeout=None):
+    self.__ensure()
+
+    with self.__lock:
+      # Rodadas de `cost` segundos até a tarefa terminar
+      rounds = self.__pending // self.workers + 1
+      if self.__pending >= self.workers + self.queue_depth or (timeout is not None and rounds * self.cost > timeout):
+        raise Overloaded()
+      self.__pending += 1
+
+    try:
+      future = self.__executor.submit(fn, *args)
+    except Exception:
+      self.__release()
+      raise
+
+    future.add_done_callback(lambda _: self.__release())
+    return future
+
+  def __release(self):
+    with self.__lock:
+      self.__pending -= 1
@@ -3,12 +3,14 @@ import base64
 import hashlib
 import hmac
 import jwt
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
 from flask import Blueprint, request, redirect, jsonify, current_app
-from passlib.context import CryptContext
 
+from ecommerce_api.config import Config
 from ecommerce_api.resources import db
 from ecommerce_api.model.user import User
+from ecommerce_api.api.rest.auth import hashing
 
 LOGGER = logging.getLogger(__name__)
 
@@ -18,6 +20,7 @@ SIGN_UP_MISSING_FIELDS = 4000
 SIGN_IN_MISSING_FIELDS = 4001
 USER_DOES_NOT_EXIST = 4002
 INVALID_AUTHENTICATION = 4003
+LOGIN_OVERLOADED = 4004
 
 
 class _ApiError(Exception):
@@ -59,10 +62,12 @@ class Iam():
         self.__url_prefix = None
         self.__session = None
         self.__secret = None
-        self.__crypt_context = CryptContext(
-          schemes=['bcrypt', 'des_crypt', 'pbkdf2_sha256', 'pbkdf2_sha512', 'sha256_crypt', 'sha512_crypt', 'plaintext'], 
-          default='sha512_crypt', deprecated=['auto']
+        self.__crypt_context = hashing.crypt_context()
+        self.__hasher = hashing.PasswordHasher(
+            Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_QUEUE_DEPTH, Config.PASSWORD_HASH_COST
         )
+        # Salva os hashes atualizados fora das threads das requests
+        self.__saver = ThreadPoolExecutor(max_workers=1)
 
 
   def init_app(self, app, url_prefix=None):
@@ -87,9 +92,21 @@ class Iam():
       url_prefix=self.__url_prefix
     )
     blueprint.route('/login', methods=['POST'])(self.__login)
+    blueprint.register_error_handler(_ApiError, self.__handle_error)
 
     return blueprint
 
+  def __handle_error(self, error):
+    response = jsonify({
+      'code': error.code,
+      'description': error.description,
+      'data': error.data,
+    })
+    response.status_code = error.status_code
+    if error.status_code == 503:
+      response.headers['Retry-After'] = '1'
+    return response
+
   def generate_token(self, user):
     """Generate a JWT toker for user authentication"""
 
@@ -120,20 +137,55 @@ class Iam():
   
   def __verify_and_updated_password(self, password, user):
     """Check if passwork is the same as in database
+
+    The hash is verified in the hashing process pool. Returns if the
+    password is valid and if the hash must be updated (deprecated scheme).
+
+    The request thread waits for the result for at most
+    `PASSWORD_HASH_TIMEOUT`. When the pending hashes would not finish
+    in time the login is refused right away with a 503.
     """
 
+    signed = password
     if self.__crypt_context.identify(user.password) != 'plaintext':
-        password = self.__get_hmac(password)
+        signed = self.__get_hmac(password)
 
-    verified, new_password = self.__crypt_context.verify_and_update(password, user.password)
-    if verified and new_password:
-        user.password = self.encrypt_password(password)
-        self.__session.add(user)
-        self.__session.commit()
-
-    return verified
+    future = None
+    try:
+        future = self.__hasher.submit(
+            hashing.verify_and_update, signed, user.password, timeout=Config.PASSWORD_HASH_TIMEOUT
+        )
+        verified, new_password = future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+    except (hashing.Overloaded, TimeoutError):
+        if future is not None:
+            # Ainda na fila: libera a vaga para as próximas tentativas
+            future.cancel()
+        raise _ApiError(status_code=503, code=LOGIN_OVERLOADED, description='Too many login attempts, try again')
+
+    return verified, bool(verified and new_password)
+
+  def __rehash_password(self, user_id, current_hash, password):
+    try:
+        future = self.__hasher.submit(hashing.hash_password, self.__get_hmac(password))
+    except hashing.Overloaded:
+        # Será atualizado em um próximo login
+        LOGGER.warning('Password rehash of user %s skipped, hashing pool is full', user_id)
+        return
+
+    future.add_done_callback(lambda f: self.__saver.submit(self.__save_password, user_id, current_hash, f))
+
+  def __save_password(self, user_id, current_hash, future):
+    with self.app.app_context():
+        try:
+            # Só substitui se a senha não foi alterada enquanto o hash era gerado
+            User.query.filter(User.id == user_id, User.password == current_hash).update(
+                {User.password: future.result()}, synchronize_session=False
+            )
+            self.__session.commit()
+        except Exception as ex:
+            self.__session.rollback()
+            LOGGER.exception(ex)
 
-  
   def __login(self, _type=None):
     """
     Process to sigin the user
@@ -161,10 +213,17 @@ class Iam():
     if not user:
       raise _ApiError(status_code=404, code=USER_DOES_NOT_EXIST, description='User does not exist')
 
-    if not self.__verify_and_updated_password(password, user):
+    verified, rehash = self.__verify_and_updated_password(password, user)
+    if not verified:
       LOGGER.exception('Invalid password')
       raise _ApiError(status_code=422, code=INVALID_AUTHENTICATION, description='Invalid authentication')
 
-    return jsonify({
+    response = jsonify({
       'token': self.generate_token(user)
     })
+    if rehash:
+      # O novo hash é gerado e salvo depois que a resposta é enviada
+      user_id, current_hash = user.id, user.password
+      response.call_on_close(lambda: self.__rehash_password(user_id, current_hash, password))
+
+    return response
@@ -6,7 +6,11 @@ from ecommerce_api.api.auth import get_auth_data
 class BaseResource(CrudResource):
   def __init__(self, model):
     CrudResource.__init__(self, model, db.session)
-    self.auth_data = get_auth_data()
+
+  @property
+  def auth_data(self):
+    """Decodificado apenas quando algum método precisa da autenticação"""
+    return get_auth_data()
 
   def check_authentication(self):
     """
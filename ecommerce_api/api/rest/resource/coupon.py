@@ -18,6 +18,9 @@ class CouponResource(BaseResource):
   def _schema(self, method):
     return CouponSchema
 
+  def _cache_single(self):
+    return True
+
   def _make_query(self, query):
 
     return query
\ No newline at end of file
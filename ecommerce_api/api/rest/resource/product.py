@@ -1,3 +1,10 @@
+from decimal import Decimal, InvalidOperation
+
+from flask import abort, jsonify, request
+from sqlalchemy import case, false
+
+from ecommerce_api import search
+from ecommerce_api.config import Config
 from ecommerce_api.model.product import Product
 from ecommerce_api.api.rest.schema.product import ProductSchema
 from ecommerce_api.api.rest.resource import BaseResource
@@ -18,6 +25,39 @@ class ProductResource(BaseResource):
   def _schema(self, method):
     return ProductSchema
 
+  def _cache_single(self):
+    return True
+
+  def _price_arg(self, name):
+    try:
+      return Decimal(request.args[name]) if request.args.get(name) else None
+    except InvalidOperation:
+      return None
+
   def _make_query(self, query):
+    # Busca textual: os `SEARCH_MAX_RESULTS` mais relevantes, em ordem de relevância
+    # quando nenhuma outra ordem é pedida
+    if request.args.get('q'):
+      try:
+        ids = search.index.search(self.session, request.args['q'], Config.SEARCH_MAX_RESULTS)
+      except search.Unavailable:
+        response = jsonify({'error': 'Search index is not ready'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        abort(response)
+      if not ids:
+        return query.filter(false())
+
+      query = query.filter(Product.id.in_(ids))
+      if not request.args.get('order'):
+        query = query.order_by(case({id: rank for rank, id in enumerate(ids)}, value=Product.id))
+
+    # Faixa de preço com desconto (coluna indexada); valores inválidos são ignorados
+    min_price = self._price_arg('min_effective_price')
+    if min_price is not None:
+      query = query.filter(Product.effective_price >= min_price)
+    max_price = self._price_arg('max_effective_price')
+    if max_price is not None:
+      query = query.filter(Product.effective_price <= max_price)
 
     return query
\ No newline at end of file
@@ -6,5 +6,6 @@ class ProductSchema(BaseSchema):
   name = fields.String()
   description = fields.String()
   price = fields.Decimal(as_string=True)
+  effective_price = fields.Decimal(as_string=True, dump_only=True)
   
   coupons = fields.Nested('CouponSchema', exclude=('products',), many=True)
@@ -0,0 +1,143 @@
+"""
+Serializador compilado para os schemas marshmallow.
+
+Gera, uma única vez por configuração de schema (classe, `only`/`exclude` e schemas
+aninhados), uma função python especializada para cada campo, com a mesma saída
+do `Schema.dump`. Schemas com campos ou hooks não suportados continuam usando
+o marshmallow.
+"""
+import decimal
+import threading
+from datetime import datetime
+
+from marshmallow import Schema, fields
+from marshmallow.utils import ensure_text_type, missing
+
+_COMPILED = {}
+_LOCK = threading.Lock()
+
+
+class _NotSupported(Exception):
+    pass
+
+
+def _signature(schema):
+    nested = tuple(
+        (name, _signature(field.schema)) for name, field in sorted(schema.dump_fields.items())
+        if isinstance(field, fields.Nested)
+    )
+    return type(schema), tuple(sorted(schema.dump_fields)), nested
+
+
+def _field_source(field, value, namespace, index):
+    """
+    Expressão python que serializa `value` (nunca None) para o campo.
+    """
+
+    field_type = type(field)
+
+    if field_type is fields.Integer and not field.as_string:
+        return 'int(%s)' % value
+
+    if field_type is fields.String:
+        return '(%s if type(%s) is str else ensure_text_type(%s))' % (value, value, value)
+
+    if field_type is fields.DateTime:
+        data_format = field.format or field.DEFAULT_FORMAT
+        format_func = field.SERIALIZATION_FUNCS.get(data_format)
+        if format_func:
+            namespace['format_%d' % index] = format_func
+            return 'format_%d(%s)' % (index, value)
+        if data_format == '%Y-%m-%dT%H:%M:%S':
+            # `isoformat` é bem mais rápido que `strftime` e gera o mesmo texto
+            # para datetimes sem timezone a partir do ano 1000.
+            return (
+                "(%s.isoformat(timespec='seconds') if type(%s) is datetime and %s.tzinfo is None "
+                "and %s.year >= 1000 else %s.strftime(%r))"
+            ) % (value, value, value, value, value, data_format)
+        return '%s.strftime(%r)' % (value, data_format)
+
+    if field_type is fields.Decimal and field.places is None and not field.allow_nan:
+        if field.as_string:
+            return "format(Decimal(str(%s)), 'f')" % value
+        return 'Decimal(str(%s))' % value
+
+    if field_type is fields.Nested:
+        namespace['nested_%d' % index] = _compile(field.schema)
+        if field.schema.many or field.many:
+            return '[nested_%d(item) for item in %s]' % (index, value)
+        return 'nested_%d(%s)' % (index, value)
+
+    raise _NotSupported(field_type.__name__)
+
+
+def _compile(schema):
+    """
+    Gera a função que serializa um objeto com o schema.
+    """
+
+    if any(schema._hooks.values()) or type(schema).get_attribute is not Schema.get_attribute:
+        raise _NotSupported(type(schema).__name__)
+
+    namespace = {
+        'Decimal': decimal.Decimal,
+        'datetime': datetime,
+        'ensure_text_type': ensure_text_type,
+        'missing': missing,
+        'EMPTY': {},
+    }
+    # Os atributos já carregados das instâncias do SQLAlchemy estão no `__dict__`,
+    # o `getattr` fica apenas para os demais (lazy, deferred, properties).
+    lines = ['def dump(obj):', '    ret = {}', "    data = getattr(obj, '__dict__', EMPTY)"]
+
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        attribute = field.attribute or name
+        key = field.data_key if field.data_key is not None else name
+        if '.' in attribute or field.default is not missing:
+            raise _NotSupported(name)
+
+        lines.extend([
+            '    value = data.get(%r, missing)' % attribute,
+            '    if value is missing:',
+            '        value = getattr(obj, %r, missing)' % attribute,
+            '    if value is not missing:',
+            '        ret[%r] = None if value is None else %s' % (key, _field_source(field, 'value', namespace, index)),
+        ])
+
+    lines.append('    return ret')
+
+    exec(compile('\n'.join(lines), '<compiled %s>' % type(schema).__name__, 'exec'), namespace)
+    return namespace['dump']
+
+
+def compiled(schema):
+    """
+    Função compilada para o schema ou None caso ele não seja suportado.
+    """
+
+    signature = _signature(schema)
+    if signature in _COMPILED:
+        return _COMPILED[signature]
+
+    with _LOCK:
+        try:
+            function = _compile(schema)
+        except _NotSupported:
+            function = None
+        _COMPILED[signature] = function
+
+    return function
+
+
+def dump(schema, obj):
+    """
+    Mesmo resultado de `schema.dump(obj)`, usando a função compilada quando possível.
+    """
+
+    function = compiled(schema)
+    if function is None or isinstance(obj, dict):
+        return schema.dump(obj)
+
+    if schema.many:
+        return [function(item) for item in obj]
+    return function(obj)
@@ -28,6 +28,57 @@ def init_sqlalquemy(app):
   LOGGER.info("Flask SQLAlquemy configurated")
 
 
+def init_metrics(app):
+  from ecommerce_api import metrics
+
+  app.before_request(metrics.start_request)
+  app.after_request(metrics.end_request)
+  app.teardown_request(metrics.record_request)
+  app.add_url_rule('/metrics', 'metrics', metrics.metrics)
+  LOGGER.info("Metrics configurated")
+
+
+def init_profiler(app):
+  if not Config.PROFILER_ENABLED:
+    return
+
+  from ecommerce_api import profiler
+
+  app.before_request(profiler.start_request)
+  app.teardown_request(profiler.end_request)
+  LOGGER.info("Profiler configurated")
+
+
+def init_instrumentation(app):
+  from ecommerce_api import instrumentation
+
+  app.before_request(instrumentation.reset_request_stats)
+  app.after_request(instrumentation.report_request_stats)
+  LOGGER.info("SQL instrumentation configurated")
+
+
+def init_cache(app):
+  from ecommerce_api import cache
+
+  app.before_request(cache.listen)
+  LOGGER.info("Entity cache invalidations configurated")
+
+
+def init_search(app):
+  from ecommerce_api import search
+
+  app.before_request(lambda: search.index.start(app))
+  LOGGER.info("Search index configurated")
+
+
+def init_routing(app):
+  from ecommerce_api import routing
+
+  app.before_request(lambda: routing.reset_request_routing(db.session))
+  app.after_request(routing.mark_write)
+  LOGGER.info("Replica routing configurated (%d replicas)", len(routing.replica_binds(app)))
+
+
 def init_migrate(app):
   migrate = Migrate()
   migrate.init_app(app, db)
@@ -51,6 +102,21 @@ def init_cors(app):
   LOGGER.info("Flask CORS configurated")
 
 
+def init_bulkheads(app):
+  from ecommerce_api.api import bulkhead
+
+  app.before_request(bulkhead.admit)
+  app.teardown_request(bulkhead.release)
+  LOGGER.info("Bulkheads configurated")
+
+
+def init_auth(app):
+  from ecommerce_api.api.auth import reset_auth_context
+
+  app.before_request(reset_auth_context)
+  LOGGER.info("Auth context configurated")
+
+
 def init_api(app):
   api = Api(app, prefix='/'+Config.VERSION)
   create_json_api(api)
@@ -59,17 +125,40 @@ def init_api(app):
 
 def api_actions(app):
   from ecommerce_api.api.rest.action.attach_coupon import actions
+  from ecommerce_api.api.rest.action.bulkheads import status
+  from ecommerce_api.api.rest.action.cart_pricing import actions as cart_actions
+  from ecommerce_api.api.rest.action.coupon_code import actions as coupon_actions
 
   app.register_blueprint(actions)
+  app.register_blueprint(status)
+  app.register_blueprint(cart_actions)
+  app.register_blueprint(coupon_actions)
+
+
+def init_commands(app):
+  from ecommerce_api.cli import bench, profile_token, seed_command
+
+  app.cli.add_command(bench)
+  app.cli.add_command(profile_token)
+  app.cli.add_command(seed_command)
 
 
 def create_app():
   app = init_flask()
   init_cors(app)
   init_sqlalquemy(app)
+  init_metrics(app)
+  init_profiler(app)
+  init_instrumentation(app)
+  init_cache(app)
+  init_search(app)
+  init_routing(app)
   init_migrate(app)
   init_iam(app)
+  init_bulkheads(app)
+  init_auth(app)
   init_api(app)
   api_actions(app)
+  init_commands(app)
 
   return app
@@ -0,0 +1,290 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from ecommerce_api.config import Config
+from ecommerce_api.lru import LRUCache
+
+LOGGER = logging.getLogger(__name__)
+
+_PENDING = 'entity_cache_invalidations'
+_LISTENERS = []
+
+
+def entity_key(resource):
+  """Chave do cache para uma instância do modelo: (tabela, id)"""
+
+  return resource.__table__.name, str(resource.id)
+
+
+class EntityCache():
+  """Interface para os caches de recursos serializados, indexados por (tabela, id).
+
+  `variant` diferencia representações do mesmo registro (ex.: parametro `fields`)
+  e `depends_on` são as chaves dos registros aninhados na representação,
+  que também invalidam a entrada.
+  """
+
+  def generation(self):
+    """Token obtido antes de ler o banco, usado no `set` para descartar
+    valores que foram invalidados durante a leitura."""
+    return None
+
+  def get(self, key, variant):
+    return None
+
+  def set(self, key, variant, value, depends_on=(), generation=None):
+    return
+
+  def invalidate(self, keys, publish=True):
+    return
+
+  def invalidated_at(self):
+    """`time.monotonic()` da última invalidação (None se não é registrado)"""
+    return None
+
+  def listen(self):
+    """Passa a receber as invalidações dos outros processos"""
+    return
+
+
+class LRUEntityCache(EntityCache):
+  """Cache em memória do processo com LRU e TTL.
+
+  As invalidações são repassadas aos outros processos da mesma máquina
+  pelo `InvalidationChannel`.
+  """
+
+  def __init__(self, size=10000, ttl=60, channel_dir=None):
+    self.size = size
+    self.ttl = ttl
+    # chave -> {'variants': {...}, 'depends_on': set()}
+    self.__items = LRUCache(size, ttl, on_evict=self.__evicted)
+    self.__dependents = {}
+    self.__invalidated_at = None
+    self.__lock = threading.Lock()
+    self.__channel = None
+
+    if channel_dir and hasattr(socket, 'AF_UNIX'):
+      self.__channel = InvalidationChannel(channel_dir, self.__remote_invalidate)
+
+  def generation(self):
+    return self.__items.generation()
+
+  def invalidated_at(self):
+    return self.__invalidated_at
+
+  def listen(self):
+    if self.__channel:
+      self.__channel.listen()
+
+  def get(self, key, variant):
+    self.listen()
+
+    with self.__lock:
+      entry = self.__items.get(key)
+      if entry is None:
+        return None
+      return entry['variants'].get(variant)
+
+  def set(self, key, variant, value, depends_on=(), generation=None):
+    self.listen()
+
+    with self.__lock:
+      if generation is not None and generation != self.__items.generation():
+        return
+
+      entry = self.__items.get(key)
+      if entry is None:
+        entry = {'variants': {}, 'depends_on': set()}
+        self.__items.set(key, entry)
+
+      entry['variants'][variant] = value
+      for dependency in depends_on:
+        entry['depends_on'].add(dependency)
+        self.__dependents.setdefault(dependency, set()).add(key)
+
+  def invalidate(self, keys, publish=True):
+    keys = set(keys)
+    if not keys:
+      return
+
+    with self.__lock:
+      self.__invalidated_at = time.monotonic()
+      dropped = set(keys)
+      for key in keys:
+        dropped.update(self.__dependents.pop(key, ()))
+      self.__items.invalidate(dropped)
+
+    if publish and self.__channel:
+      self.__channel.publish(keys)
+
+  def __remote_invalidate(self, keys):
+    self.invalidate(keys, publish=False)
+    notify_listeners(keys)
+
+  def __evicted(self, key, entry):
+    for dependency in entry['depends_on']:
+      dependents = self.__dependents.get(dependency)
+      if dependents:
+        dependents.discard(key)
+        if not dependents:
+          del self.__dependents[dependency]
+
+
+class InvalidationChannel():
+  """Canal local entre os processos (workers) da máquina.
+
+  Cada processo cria um socket unix de datagrama em `directory` e as
+  invalidações são enviadas para todos os sockets do diretório.
+  """
+
+  BATCH = 500
+
+  def __init__(self, directory, handler):
+    self.directory = directory
+    self.handler = handler
+    self.__pid = None
+    self.__path = None
+    self.__lock = threading.Lock()
+
+  def listen(self):
+    """Cria o socket do processo atual (também após um fork)"""
+
+    if self.__pid == os.getpid():
+      return
+
+    with self.__lock:
+      if self.__pid == os.getpid():
+        return
+
+      os.makedirs(self.directory, exist_ok=True)
+      path = os.path.join(self.directory, '%d.sock' % os.getpid())
+      if os.path.exists(path):
+        os.unlink(path)
+
+      sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+      sock.bind(path)
+
+      self.__path = path
+      self.__pid = os.getpid()
+
+      thread = threading.Thread(target=self.__receive, args=(sock,), daemon=True)
+      thread.start()
+      atexit.register(self.__close, path)
+
+  def publish(self, keys):
+    self.listen()
+
+    keys = [list(key) for key in keys]
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+      for name in os.listdir(self.directory):
+        path = os.path.join(self.directory, name)
+        if not name.endswith('.sock') or path == self.__path:
+          continue
+
+        for start in range(0, len(keys), self.BATCH):
+          payload = json.dumps(keys[start:start + self.BATCH]).encode('utf-8')
+          try:
+            sock.sendto(payload, path)
+          except (ConnectionRefusedError, FileNotFoundError):
+            # Processo que já terminou
+            self.__close(path)
+            break
+          except OSError as ex:
+            LOGGER.warning('Entity cache invalidation not sent to %s: %s', path, ex)
+            break
+    finally:
+      sock.close()
+
+  def __receive(self, sock):
+    while True:
+      try:
+        payload = sock.recv(65536 * 4)
+        self.handler([tuple(key) for key in json.loads(payload)])
+      except Exception as ex:
+        LOGGER.exception(ex)
+
+  @staticmethod
+  def __close(path):
+    try:
+      os.unlink(path)
+    except OSError:
+      pass
+
+
+entity_cache = LRUEntityCache(
+  Config.ENTITY_CACHE_SIZE,
+  Config.ENTITY_CACHE_TTL,
+  Config.ENTITY_CACHE_CHANNEL_DIR
+)
+
+
+def set_entity_cache(cache):
+  """Substitui a implementação do cache (deve seguir a interface `EntityCache`)"""
+
+  global entity_cache
+  entity_cache = cache
+
+
+def listen():
+  """Registrado como `before_request`: os caches que usam as invalidações
+  (`add_invalidation_listener`) podem ser lidos sem passar pelo cache de
+  entidades, então o canal é criado em cada processo antes da primeira request."""
+
+  entity_cache.listen()
+
+
+def add_invalidation_listener(listener):
+  """`listener(keys)` é chamado com as chaves alteradas após cada commit,
+  deste processo ou recebidas dos outros pelo canal de invalidação."""
+
+  _LISTENERS.append(listener)
+
+
+def notify_listeners(keys):
+  for listener in _LISTENERS:
+    try:
+      listener(keys)
+    except Exception as ex:
+      LOGGER.exception(ex)
+
+
+def mark_changed(session, keys):
+  """Registra as chaves alteradas na transação da sessão.
+  A invalidação acontece apenas após o commit."""
+
+  if session is not None:
+    session.info.setdefault(_PENDING, set()).update(keys)
+
+
+def pending_changes(session):
+  """Chaves registradas na transação da sessão que ainda não foram invalidadas"""
+
+  return set(session.info.get(_PENDING, ()))
+
+
+def mark_resource_changed(resource):
+  if resource.id is not None:
+    mark_changed(object_session(resource), [entity_key(resource)])
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+  keys = session.info.pop(_PENDING, None)
+  if keys:
+    entity_cache.invalidate(keys)
+    notify_listeners(keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+  session.info.pop(_PENDING, None)
@@ -0,0 +1,577 @@
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, jsonify
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import func, select
+
+bench = AppGroup('bench', help='Benchmarks da API.')
+
+
+@click.command('profile-token')
+@click.option('--ttl', default=300, help='Validade em segundos.')
+def profile_token(ttl):
+  """Valor do header que habilita o profiling de uma request (PROFILER_ENABLED=1)."""
+
+  from ecommerce_api import profiler
+  from ecommerce_api.config import Config
+
+  click.echo('%s: %s' % (Config.PROFILER_HEADER, profiler.debug_token(ttl)))
+
+
+def _sqlite_pool_options(app):
+  """Remove as opções de pool do `Config`, que o SQLite não aceita"""
+
+  if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    for option in ('SQLALCHEMY_POOL_SIZE', 'SQLALCHEMY_MAX_OVERFLOW', 'SQLALCHEMY_POOL_TIMEOUT'):
+      app.config[option] = None
+
+
+def _best_of(repeat, fn):
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    timings.append(time.perf_counter() - start)
+  return min(timings)
+
+
+def _catalogue(rows, coupons_per_product=3, coupons=100):
+  """Produtos e cupons em memória (sem banco) para os benchmarks de serialização"""
+
+  from ecommerce_api.model import Coupon, Product
+
+  now = datetime(2021, 4, 4, 22, 32, 51)
+  coupons = [
+    Coupon(
+      id=i, code='COUPON%d' % i, discount_percent=(i % 50) + 0.5, discount_value=None if i % 2 else i * 1.25,
+      created_at=now, updated_at=now + timedelta(seconds=i)
+    )
+    for i in range(1, coupons + 1)
+  ]
+
+  products = []
+  for i in range(1, rows + 1):
+    products.append(Product(
+      id=i, name='Product %d' % i, description='Description of the product %d' % i, price=i * 0.99,
+      created_at=now, updated_at=now + timedelta(seconds=i),
+      coupons=[coupons[(i + c) % len(coupons)] for c in range(coupons_per_product)]
+    ))
+  return products, coupons
+
+
+@bench.command('serializer')
+@click.option('--rows', default=10000, help='Quantidade de produtos serializados.')
+@click.option('--repeat', default=5, help='Repetições (é considerado o menor tempo).')
+def serializer_benchmark(rows, repeat):
+  """Compara o `Schema.dump` do marshmallow com o serializador compilado,
+  verificando antes se as saídas são iguais."""
+
+  from ecommerce_api.api import serializer
+  from ecommerce_api.api.rest.schema.coupon import CouponSchema
+  from ecommerce_api.api.rest.schema.product import ProductSchema
+  from ecommerce_api.api.rest.schema.user import UserSchema
+  from ecommerce_api.model import User
+
+  products, coupons = _catalogue(rows)
+  users = [
+    User(id=i, username='user%d' % i, password='secret', created_at=products[0].created_at)
+    for i in range(1, min(rows, 1000) + 1)
+  ]
+
+  cases = [
+    ('ProductSchema', ProductSchema(many=True), products),
+    ('ProductSchema(only=id,name,price)', ProductSchema(many=True, only=('id', 'name', 'price')), products),
+    ('CouponSchema', CouponSchema(many=True), coupons),
+    ('UserSchema', UserSchema(many=True), users),
+  ]
+
+  for name, schema, objects in cases:
+    if serializer.compiled(schema) is None:
+      raise click.ClickException('%s is not supported by the compiled serializer' % name)
+
+    if serializer.dump(schema, objects) != schema.dump(objects):
+      raise click.ClickException('%s: compiled output differs from marshmallow' % name)
+
+    marshmallow_time = _best_of(repeat, lambda: schema.dump(objects))
+    compiled_time = _best_of(repeat, lambda: serializer.dump(schema, objects))
+    click.echo('%-36s %6d rows  marshmallow %8.2f ms  compiled %8.2f ms  %5.1fx' % (
+      name, len(objects), marshmallow_time * 1000, compiled_time * 1000, marshmallow_time / compiled_time
+    ))
+
+
+def _percentile(timings, percent):
+  timings = sorted(timings)
+  return timings[min(len(timings) - 1, int(len(timings) * percent / 100))]
+
+
+@bench.command('association')
+@click.option('--url', default='sqlite://', help='Banco utilizado (as tabelas são criadas e removidas).')
+@click.option('--rows', default=1000000, help='Quantidade de associações produto/cupom.')
+@click.option('--products', default=100000)
+@click.option('--coupons', default=10000)
+@click.option('--lookups', default=100, help='Consultas medidas em cada cenário.')
+@click.option('--seed', default=42)
+def association_benchmark(url, rows, products, coupons, lookups, seed):
+  """Latência dos joins pela tabela products_coupons sem chaves (como na migração inicial)
+  e com a chave primária composta e o índice reverso."""
+
+  from sqlalchemy import (
+    Column, ForeignKey, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, create_engine, text
+  )
+
+  random.seed(seed)
+  engine = create_engine(url)
+  metadata = MetaData()
+
+  Table('bench_product', metadata, Column('id', Integer, primary_key=True), Column('name', String(256)))
+  Table('bench_coupon', metadata, Column('id', Integer, primary_key=True), Column('code', String(64)))
+  tables = {
+    'heap': Table(
+      'bench_pc_heap', metadata,
+      Column('product_id', Integer, ForeignKey('bench_product.id')),
+      Column('coupon_id', Integer, ForeignKey('bench_coupon.id'))
+    ),
+    'keyed': Table(
+      'bench_pc_keyed', metadata,
+      Column('product_id', Integer, ForeignKey('bench_product.id'), nullable=False),
+      Column('coupon_id', Integer, ForeignKey('bench_coupon.id'), nullable=False),
+      PrimaryKeyConstraint('product_id', 'coupon_id'),
+      Index('ix_bench_pc_keyed_coupon_id_product_id', 'coupon_id', 'product_id')
+    ),
+  }
+
+  metadata.drop_all(engine)
+  metadata.create_all(engine)
+
+  try:
+    chunk = 10000
+    with engine.begin() as connection:
+      for start in range(1, products + 1, chunk):
+        connection.execute(metadata.tables['bench_product'].insert(), [
+          {'id': i, 'name': 'Product %d' % i} for i in range(start, min(start + chunk, products + 1))
+        ])
+      connection.execute(metadata.tables['bench_coupon'].insert(), [
+        {'id': i, 'code': 'COUPON%d' % i} for i in range(1, coupons + 1)
+      ])
+
+      pairs = set()
+      while len(pairs) < rows:
+        pairs.add((random.randint(1, products), random.randint(1, coupons)))
+      pairs = [{'product_id': p, 'coupon_id': c} for p, c in pairs]
+
+      for table in tables.values():
+        for start in range(0, len(pairs), chunk):
+          connection.execute(table.insert(), pairs[start:start + chunk])
+    click.echo('Seeded %d products, %d coupons and %d associations' % (products, coupons, rows))
+
+    scenarios = [
+      ('coupons of a product', products, (
+        'SELECT c.id, c.code FROM {table} pc JOIN bench_coupon c ON c.id = pc.coupon_id '
+        'WHERE pc.product_id = :id'
+      )),
+      ('products of a coupon', coupons, (
+        'SELECT p.id, p.name FROM {table} pc JOIN bench_product p ON p.id = pc.product_id '
+        'WHERE pc.coupon_id = :id'
+      )),
+      ('min coupon code (nested sort)', products, (
+        'SELECT (SELECT MIN(c.code) FROM {table} pc JOIN bench_coupon c ON c.id = pc.coupon_id '
+        'WHERE pc.product_id = p.id) FROM bench_product p WHERE p.id = :id'
+      )),
+    ]
+
+    with engine.connect() as connection:
+      for name, size, sql in scenarios:
+        ids = [random.randint(1, size) for _ in range(lookups)]
+        for variant, table in tables.items():
+          statement = text(sql.format(table=table.name))
+          timings = []
+          for id in ids:
+            start = time.perf_counter()
+            connection.execute(statement, id=id).fetchall()
+            timings.append(time.perf_counter() - start)
+
+          click.echo('%-32s %-6s p50 %8.3f ms  p95 %8.3f ms' % (
+            name, variant, _percentile(timings, 50) * 1000, _percentile(timings, 95) * 1000
+          ))
+  finally:
+    metadata.drop_all(engine)
+
+
+def _seed_catalogue(engine, products, coupons, links_per_product=3, skew=0.0, seed=42, chunk=10000, progress=None):
+  """Insere um catálogo sintético e determinístico com `executemany` do Core,
+  sem passar pelo ORM (e pelos listeners do `AuditedModelBase`).
+
+  Os ids continuam a partir dos maiores ids existentes. Cada produto recebe
+  de 0 a `2 * links_per_product` cupons, sorteados com popularidade Zipf de
+  expoente `skew` (0 é uniforme), e o `effective_price` já calculado.
+  Cada lote é gravado em uma transação.
+  """
+
+  from ecommerce_api.model import Coupon, Product
+  from ecommerce_api.model.effective_price import effective_price
+  from ecommerce_api.model.product import products_coupons
+
+  rnd = random.Random(seed)
+  now = datetime(2021, 4, 4, 22, 32, 51)
+
+  with engine.connect() as connection:
+    first_product = (connection.execute(select([func.max(Product.__table__.c.id)])).scalar() or 0) + 1
+    first_coupon = (connection.execute(select([func.max(Coupon.__table__.c.id)])).scalar() or 0) + 1
+
+  coupon_ids = list(range(first_coupon, first_coupon + coupons))
+  discounts = {}
+  for start in range(0, coupons, chunk):
+    rows = []
+    for id in coupon_ids[start:start + chunk]:
+      discounts[id] = (rnd.randint(1, 50), None) if id % 2 else (None, round(rnd.uniform(1, 100), 2))
+      rows.append({
+        'id': id, 'code': 'COUPON%d' % id, 'created_at': now, 'updated_at': now,
+        'discount_percent': discounts[id][0], 'discount_value': discounts[id][1],
+      })
+    with engine.begin() as connection:
+      connection.execute(Coupon.__table__.insert(), rows)
+    if progress:
+      progress('coupons', min(start + chunk, coupons), coupons)
+
+  cumulative = None
+  if coupon_ids:
+    weights = [1 / (rank ** skew) for rank in range(1, len(coupon_ids) + 1)]
+    cumulative = list(itertools.accumulate(weights))
+
+  links = 0
+  for start in range(first_product, first_product + products, chunk):
+    ids = range(start, min(start + chunk, first_product + products))
+    rows, links_rows = [], []
+    for id in ids:
+      price = round(rnd.uniform(1, 1000), 2)
+      product_coupons = set()
+      if cumulative and links_per_product:
+        size = rnd.randint(0, 2 * links_per_product)
+        product_coupons = set(rnd.choices(coupon_ids, cum_weights=cumulative, k=size))
+        links_rows.extend({'product_id': id, 'coupon_id': coupon_id} for coupon_id in product_coupons)
+
+      rows.append({
+        'id': id, 'name': 'Product %d' % id, 'description': 'Description of the product %d' % id,
+        'price': price, 'created_at': now + timedelta(seconds=id), 'updated_at': now,
+        'effective_price': effective_price(price, [discounts[coupon_id] for coupon_id in product_coupons]),
+      })
+
+    with engine.begin() as connection:
+      connection.execute(Product.__table__.insert(), rows)
+      if links_rows:
+        connection.execute(products_coupons.insert(), links_rows)
+
+    links += len(links_rows)
+    if progress:
+      progress('products', ids[-1] - first_product + 1, products)
+
+  return links
+
+
+@click.command('seed')
+@click.option('--products', default=1000000)
+@click.option('--coupons', default=20000)
+@click.option('--links', 'links_per_product', default=5, help='Média de cupons por produto.')
+@click.option('--skew', default=1.1, help='Expoente Zipf da popularidade dos cupons (0 é uniforme).')
+@click.option('--seed', default=42)
+@click.option('--chunk', default=10000, help='Registros por executemany.')
+@with_appcontext
+def seed_command(products, coupons, links_per_product, skew, seed, chunk):
+  """Popula o banco com um catálogo sintético (produtos, cupons e associações).
+
+  Os inserts não passam pelo ORM: o cache de entidades dos servidores
+  em execução não é invalidado. No MySQL as tabelas vêm das migrações
+  (`flask db upgrade`); no SQLite são criadas pelo comando.
+  """
+
+  from ecommerce_api.resources import db
+
+  _sqlite_pool_options(current_app)
+  if db.engine.dialect.name == 'sqlite':
+    db.create_all()
+
+  start = time.perf_counter()
+
+  def progress(name, done, total):
+    click.echo('\r%-8s %10d / %d  (%.0f s)' % (name, done, total, time.perf_counter() - start), nl=done >= total)
+
+  links = _seed_catalogue(db.engine, products, coupons, links_per_product, skew, seed, chunk, progress)
+  click.echo('Seeded %d products, %d coupons and %d associations in %.1f s' % (
+    products, coupons, links, time.perf_counter() - start
+  ))
+
+
+def _fill(value, rnd, sizes):
+  """Substitui `{product}`, `{coupon}` e `{page}` por valores sorteados"""
+
+  if isinstance(value, dict):
+    return {key: _fill(item, rnd, sizes) for key, item in value.items()}
+  if isinstance(value, list):
+    return [_fill(item, rnd, sizes) for item in value]
+  if isinstance(value, str):
+    numbers = {name: rnd.randint(1, max(size, 1)) for name, size in sizes.items()}
+    if value.strip('{}') in numbers and value == '{%s}' % value.strip('{}'):
+      return numbers[value.strip('{}')]
+    return value.format(**numbers)
+  return value
+
+
+def _replay_stats(timings, statuses, elapsed):
+  return {
+    'requests': len(timings),
+    'throughput': len(timings) / elapsed if elapsed else 0,
+    'errors': sum(1 for status in statuses if status >= 500),
+    'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    'mean': sum(timings) / len(timings) * 1000,
+    'p50': _percentile(timings, 50) * 1000,
+    'p95': _percentile(timings, 95) * 1000,
+    'p99': _percentile(timings, 99) * 1000,
+  }
+
+
+@bench.command('replay')
+@click.option(
+  '--mix', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'replay.jsonl'),
+  help='Mix de requests (JSONL com method, path, json, weight e name).'
+)
+@click.option('--database', default=None, help='Banco já populado (ex.: MySQL local). Padrão: SQLite recriado e populado.')
+@click.option('--requests', 'total', default=2000, help='Quantidade de requests enviadas.')
+@click.option('--concurrency', default=8)
+@click.option('--products', default=5000, help='Produtos do SQLite populado.')
+@click.option('--coupons', default=500, help='Cupons do SQLite populado.')
+@click.option('--seed', default=42)
+@click.option('--output', default=None, help='Arquivo JSON com o resultado.')
+@click.option('--baseline', default=None, help='Resultado JSON anterior para comparação.')
+@click.option('--threshold', default=10.0, help='Piora percentual aceita no p95 e no throughput.')
+def replay_benchmark(mix, database, total, concurrency, products, coupons, seed, output, baseline, threshold):
+  """Reproduz um mix de requests contra o `create_app()` e mede throughput
+  e latência (p50/p95/p99) por endpoint."""
+
+  import jwt
+  from ecommerce_api import search
+  from ecommerce_api.app import create_app
+  from ecommerce_api.resources import db
+
+  with open(mix) as file:
+    entries = [json.loads(line) for line in file if line.strip()]
+
+  app = create_app()
+  if database is None:
+    path = os.path.join(tempfile.gettempdir(), 'ecommerce-api-replay.db')
+    if os.path.exists(path):
+      os.remove(path)
+    database = 'sqlite:///' + path
+
+  app.config['SQLALCHEMY_DATABASE_URI'] = database
+  _sqlite_pool_options(app)
+
+  with app.app_context():
+    if database.startswith('sqlite'):
+      db.create_all()
+      _seed_catalogue(db.engine, products, coupons, seed=seed)
+      click.echo('Seeded %d products and %d coupons in %s' % (products, coupons, database))
+
+    from ecommerce_api.model import Coupon, Product
+    sizes = {
+      'product': db.session.query(db.func.max(Product.id)).scalar() or 0,
+      'coupon': db.session.query(db.func.max(Coupon.id)).scalar() or 0,
+      'page': 10,
+    }
+    db.session.remove()
+
+  # O índice da busca é construído em segundo plano; as buscas medidas não devem receber o 503 da carga
+  search.index.start(app)
+  if not search.index.wait(120):
+    click.echo('Search index not ready, searches will answer 503')
+
+  token = jwt.encode({'id': 1, 'username': 'replay'}, app.config['SECRET_KEY'], algorithm='HS256').decode('utf-8')
+  headers = {'Authorization': 'Bearer ' + token}
+
+  rnd = random.Random(seed)
+  weights = [entry.get('weight', 1) for entry in entries]
+  schedule = []
+  for entry in rnd.choices(entries, weights=weights, k=total):
+    method = entry.get('method', 'GET').upper()
+    name = entry.get('name') or '%s %s' % (method, entry['path'].split('?')[0])
+    schedule.append((name, method, _fill(entry['path'], rnd, sizes), _fill(entry.get('json'), rnd, sizes)))
+
+  results = {}
+  lock = threading.Lock()
+  local = threading.local()
+
+  def send(item):
+    name, method, path, body = item
+    if not hasattr(local, 'client'):
+      local.client = app.test_client()
+
+    start = time.perf_counter()
+    response = local.client.open(path, method=method, json=body, headers=headers)
+    response.get_data()
+    elapsed = time.perf_counter() - start
+    response.close()
+
+    with lock:
+      timings, statuses = results.setdefault(name, ([], []))
+      timings.append(elapsed)
+      statuses.append(response.status_code)
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    list(executor.map(send, schedule))
+  elapsed = time.perf_counter() - start
+
+  report = {
+    'date': datetime.utcnow().isoformat(timespec='seconds'),
+    'mix': os.path.basename(mix),
+    'database': database.split('://')[0],
+    'requests': total,
+    'concurrency': concurrency,
+    'elapsed': elapsed,
+    'throughput': total / elapsed,
+    'endpoints': {name: _replay_stats(timings, statuses, elapsed) for name, (timings, statuses) in sorted(results.items())},
+  }
+
+  click.echo('%-34s %7s %9s %9s %9s %9s %6s' % ('endpoint', 'reqs', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', '5xx'))
+  for name, stats in report['endpoints'].items():
+    click.echo('%-34s %7d %9.1f %9.2f %9.2f %9.2f %6d' % (
+      name, stats['requests'], stats['throughput'], stats['p50'], stats['p95'], stats['p99'], stats['errors']
+    ))
+  click.echo('Total: %d requests in %.2f s (%.1f req/s)' % (total, elapsed, report['throughput']))
+
+  if output:
+    with open(output, 'w') as file:
+      json.dump(report, file, indent=2)
+
+  if baseline:
+    with open(baseline) as file:
+      base = json.load(file)
+
+    regressions = []
+    for name, stats in report['endpoints'].items():
+      before = base['endpoints'].get(name)
+      if before is None:
+        continue
+      if stats['p95'] > before['p95'] * (1 + threshold / 100):
+        regressions.append('%s: p95 %.2f ms -> %.2f ms' % (name, before['p95'], stats['p95']))
+      if stats['errors'] > before['errors']:
+        regressions.append('%s: 5xx %d -> %d' % (name, before['errors'], stats['errors']))
+    if report['throughput'] < base['throughput'] * (1 - threshold / 100):
+      regressions.append('throughput %.1f -> %.1f req/s' % (base['throughput'], report['throughput']))
+
+    if regressions:
+      raise click.ClickException('Regressions against %s:\n  %s' % (baseline, '\n  '.join(regressions)))
+    click.echo('No regressions against %s' % baseline)
+
+
+def _nested_payload(products, coupons_per_product=3, products_per_coupon=5):
+  """Payload já serializado com três níveis (produto > cupons > produtos)"""
+
+  return [
+    {
+      'id': i, 'name': 'Product %d' % i, 'description': 'Description %d' % i, 'price': i * 0.99,
+      'created_at': '2021-04-04T22:32:51', 'updated_at': '2021-04-04T22:32:51',
+      'coupons': [
+        {
+          'id': c, 'code': 'COUPON%d' % c, 'discount_percent': 10.0, 'discount_value': None,
+          'created_at': '2021-04-04T22:32:51', 'updated_at': '2021-04-04T22:32:51',
+          'products': [{'id': p, 'name': 'Product %d' % p, 'price': p * 0.99} for p in range(products_per_coupon)]
+        }
+        for c in range(coupons_per_product)
+      ]
+    }
+    for i in range(1, products + 1)
+  ]
+
+
+def _micro_cases():
+  from ecommerce_api.api import serializer
+  from ecommerce_api.api.rest.resource.product import ProductResource
+  from ecommerce_api.api.rest.schema.coupon import CouponSchema
+  from ecommerce_api.api.rest.schema.product import ProductSchema
+  from ecommerce_api.model import Product
+
+  resource = ProductResource()
+  products, coupons = _catalogue(1000, coupons=1000)
+  payload = _nested_payload(100)
+  fields = ['id', 'name', 'coupons.code', 'coupons.products.id', 'coupons.products.name']
+  order_schema = ProductSchema(many=True)
+
+  cases = [
+    ('_to_dict', lambda: resource._to_dict(products[0])),
+    ('_remove_fields nested x100', lambda: resource._remove_fields(payload, fields=list(fields))),
+    ('_define_search_order nested', lambda: resource._define_search_order(
+      resource.session.query(Product), order_schema, orders=['-price', 'coupons.code', 'name']
+    )),
+  ]
+
+  for rows in (10, 100, 1000):
+    for name, schema_class, objects in (('Product', ProductSchema, products), ('Coupon', CouponSchema, coupons)):
+      schema = schema_class(many=True)
+      page = objects[:rows]
+      cases.append(('%sSchema.dump %d' % (name, rows), lambda schema=schema, page=page: schema.dump(page)))
+      cases.append((
+        '%sSchema compiled %d' % (name, rows), lambda schema=schema, page=page: serializer.dump(schema, page)
+      ))
+
+  envelope = {
+    'objects': ProductSchema(many=True).dump(products[:100]), 'page': 1,
+    'num_results': 1000, 'total_pages': 10, 'count': 'exact'
+  }
+  cases.append(('jsonify envelope 100', lambda: jsonify(envelope)))
+  return cases
+
+
+@bench.command('micro')
+@click.option('--repeat', default=7, help='Rodadas de cada caso (é considerado o menor tempo).')
+@click.option('--only', default=None, help='Executa apenas os casos que contêm o texto.')
+@click.option('--output', default=None, help='Arquivo JSON com o resultado.')
+@click.option('--baseline', default=None, help='Resultado JSON anterior para comparação.')
+@click.option('--threshold', default=15.0, help='Piora percentual aceita por caso.')
+def micro_benchmark(repeat, only, output, baseline, threshold):
+  """Microbenchmarks das partes do CrudResource que mais consomem CPU,
+  sem servidor web nem banco."""
+
+  _sqlite_pool_options(current_app)
+
+  results = {}
+  with current_app.test_request_context('/v1/product'):
+    for name, fn in _micro_cases():
+      if only and only not in name:
+        continue
+
+      # Cada rodada dura ao menos 0.2 s; o gc fica desabilitado durante as medições
+      timer = timeit.Timer(fn)
+      number, _ = timer.autorange()
+      number = max(1, number)
+      timings = [timing / number for timing in timer.repeat(repeat, number)]
+      results[name] = {'best': min(timings) * 1e6, 'median': sorted(timings)[len(timings) // 2] * 1e6, 'loops': number}
+      click.echo('%-34s %12.2f us  (median %12.2f us, %d loops)' % (
+        name, results[name]['best'], results[name]['median'], number
+      ))
+
+  if output:
+    with open(output, 'w') as file:
+      json.dump({'date': datetime.utcnow().isoformat(timespec='seconds'), 'cases': results}, file, indent=2)
+
+  if baseline:
+    with open(baseline) as file:
+      base = json.load(file)['cases']
+
+    regressions = [
+      '%s: %.2f us -> %.2f us' % (name, base[name]['best'], stats['best'])
+      for name, stats in results.items()
+      if name in base and stats['best'] > base[name]['best'] * (1 + threshold / 100)
+    ]
+    if regressions:
+      raise click.ClickException('Regressions against %s:\n  %s' % (baseline, '\n  '.join(regressions)))
+    click.echo('No regressions against %s' % baseline)
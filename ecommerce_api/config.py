@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 class Config():
@@ -14,3 +15,75 @@ class Config():
   SQLALCHEMY_MAX_OVERFLOW = 10
   SQLALCHEMY_POOL_RECYCLE = 60 * 60 * 2
   SQLALCHEMY_POOL_TIMEOUT = 30
+
+  # Réplicas de leitura (ver `ecommerce_api.routing`)
+  DATABASE_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+  SQLALCHEMY_BINDS = {'replica_%d' % index: url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+  REPLICA_STRATEGY = os.environ.get('REPLICA_STRATEGY', 'round_robin')
+  REPLICA_STALENESS_WINDOW = 5
+  # Cookie e header com o instante da última escrita do cliente
+  REPLICA_WRITE_MARKER = 'X-Last-Write'
+
+  COUNT_CACHE_TTL = 10
+  COUNT_CACHE_SIZE = 1024
+
+  STREAM_BATCH_SIZE = 500
+
+  ENTITY_CACHE_SIZE = 10000
+  ENTITY_CACHE_TTL = 60
+  ENTITY_CACHE_CHANNEL_DIR = os.environ.get(
+    'ENTITY_CACHE_CHANNEL_DIR', os.path.join(tempfile.gettempdir(), 'ecommerce-api-cache')
+  )
+
+  COMPILED_SERIALIZER = os.environ.get('COMPILED_SERIALIZER') == '1'
+
+  BULK_MAX_ITEMS = 5000
+
+  PRICING_INDEX_SIZE = 100000
+  PRICING_INDEX_TTL = 60
+
+  COUPON_CODE_CACHE_SIZE = 10000
+  COUPON_CODE_CACHE_TTL = 60
+
+  # Busca textual (`?q=`): quantidade máxima de resultados e de palavras por prefixo
+  SEARCH_MAX_RESULTS = 1000
+  SEARCH_PREFIX_EXPANSIONS = 50
+  # Limite de memória do índice (entradas palavra/produto por processo) e idade máxima até a reconstrução
+  SEARCH_INDEX_MAX_POSTINGS = int(os.environ.get('SEARCH_INDEX_MAX_POSTINGS', 5000000))
+  SEARCH_INDEX_MAX_AGE = 3600
+
+  AUTH_TOKEN_CACHE_SIZE = 10000
+  AUTH_TOKEN_CACHE_TTL = 300
+
+  PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+  PASSWORD_HASH_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_QUEUE_DEPTH', 16))
+  # Duração esperada de uma verificação (sha512_crypt do HMAC da senha) em um worker e
+  # espera máxima da request pelo resultado, com a thread bloqueada. Logins que não
+  # terminariam nesse tempo recebem 503 com Retry-After sem esperar
+  PASSWORD_HASH_COST = float(os.environ.get('PASSWORD_HASH_COST', 1))
+  PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 2.5))
+
+  # Limites por classe de endpoint, por processo (ver `ecommerce_api.api.bulkhead`).
+  # A soma dos limites (15) não passa do `SQLALCHEMY_POOL_SIZE`: o overflow fica para
+  # o que não passa pelos bulkheads
+  BULKHEADS = {
+    'read': {'limit': 8, 'queue': 50, 'timeout': 5},
+    'write': {'limit': 3, 'queue': 20, 'timeout': 5},
+    'actions': {'limit': 2, 'queue': 10, 'timeout': 5},
+    'login': {'limit': 2, 'queue': 10, 'timeout': 2, 'status': 429},
+  }
+
+  # Instrumentação das queries (ver `ecommerce_api.instrumentation`)
+  SQL_SERVER_TIMING = True
+  SQL_SLOW_QUERY_MS = 500
+  SQL_N_PLUS_ONE_THRESHOLD = 5
+
+  # Métricas do `/metrics`, compartilhadas entre os processos pelos arquivos do diretório
+  METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ecommerce-api-metrics'))
+  METRICS_FLUSH_INTERVAL = 1
+
+  # Profiling por amostragem (ver `ecommerce_api.profiler`)
+  PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'
+  PROFILER_SAMPLE_RATE = int(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+  PROFILER_HEADER = 'X-Debug-Profile'
+  PROFILER_DIR = os.environ.get('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'ecommerce-api-profiles'))
@@ -0,0 +1,77 @@
+"""
+Cache em memória dos cupons por código, usado na validação dos códigos no checkout.
+
+Guarda também os códigos desconhecidos (cache negativo), em um LRU separado.
+As entradas são descartadas pelas invalidações do cache de entidades
+(`cache.add_invalidation_listener`): a alteração ou remoção de um cupom descarta
+os seus códigos e qualquer alteração de cupom (inclusive a criação) descarta
+os códigos desconhecidos, que podem ter passado a existir.
+"""
+import threading
+
+from ecommerce_api import cache
+from ecommerce_api.config import Config
+from ecommerce_api.lru import LRUCache
+from ecommerce_api.model import Coupon
+
+
+class CouponCodeCache():
+  def __init__(self, size=10000, ttl=60):
+    # código -> (coupon id, representação)
+    self.__found = LRUCache(size, ttl, on_evict=self.__evicted)
+    # códigos desconhecidos
+    self.__missing = LRUCache(size, ttl)
+    # coupon id -> códigos
+    self.__codes = {}
+    self.__lock = threading.Lock()
+
+  def generation(self):
+    return self.__found.generation(), self.__missing.generation()
+
+  def invalidate(self, keys):
+    ids = {int(id) for table, id in keys if table == Coupon.__table__.name}
+    if not ids:
+      return
+
+    with self.__lock:
+      codes = set().union(*(self.__codes.pop(id, ()) for id in ids))
+    self.__found.invalidate(codes)
+    self.__missing.clear()
+
+  def get(self, code):
+    """(True, representação), (True, None) para um código desconhecido
+    ou (False, None) quando o código não está no cache"""
+
+    entry = self.__found.get(code)
+    if entry is not None:
+      return True, entry[1]
+
+    if self.__missing.get(code):
+      return True, None
+
+    return False, None
+
+  def set(self, code, id, value, generation=None):
+    """`id` e `value` None registram o código como desconhecido"""
+
+    found, missing = generation if generation is not None else (None, None)
+    if id is None:
+      self.__missing.set(code, True, generation=missing)
+      return
+
+    # Registrado antes do valor: uma invalidação no meio descarta o `set` pela geração
+    with self.__lock:
+      self.__codes.setdefault(id, set()).add(code)
+    self.__found.set(code, (id, value), generation=found)
+
+  def __evicted(self, code, entry):
+    with self.__lock:
+      codes = self.__codes.get(entry[0])
+      if codes:
+        codes.discard(code)
+        if not codes:
+          del self.__codes[entry[0]]
+
+
+codes = CouponCodeCache(Config.COUPON_CODE_CACHE_SIZE, Config.COUPON_CODE_CACHE_TTL)
+cache.add_invalidation_listener(codes.invalidate)
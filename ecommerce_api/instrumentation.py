@@ -0,0 +1,187 @@
+"""
+Instrumentação das queries SQL executadas em cada request.
+
+Registra a quantidade de statements, o tempo no banco e as linhas retornadas,
+enviados no header `Server-Timing`, registra no log os statements lentos com o
+plano de execução (EXPLAIN) e os statements repetidos na mesma request (N+1).
+Os parâmetros dos statements lentos vão para o log apenas com o tipo e o tamanho
+(podem conter senhas, hashes e dados dos usuários).
+"""
+import logging
+import os
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from ecommerce_api.config import Config
+
+LOGGER = logging.getLogger(__name__)
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_STARTS = 'instrumentation_query_start'
+
+
+class RequestStats():
+  def __init__(self):
+    self.statements = 0
+    self.time = 0.0
+    self.rows = 0
+    self.shapes = Counter()
+    # Origem (arquivo, linha e função) dos statements repetidos
+    self.repeated = {}
+    # Profundidade dos blocos `batch` em andamento
+    self.batch = 0
+
+
+def instrument(engine):
+  """Registra os eventos no engine do `db`"""
+
+  event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+  event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+  event.listen(engine, 'handle_error', _handle_error)
+
+
+def reset_request_stats():
+  """Registrado como `before_request`"""
+
+  g._sql_stats = RequestStats()
+
+
+@contextmanager
+def batch():
+  """Statements repetidos por construção (ex.: um INSERT por item da criação em
+  lote): continuam nas estatísticas, mas não são reportados como N+1"""
+
+  stats = _request_stats()
+  if stats is not None:
+    stats.batch += 1
+  try:
+    yield
+  finally:
+    if stats is not None:
+      stats.batch -= 1
+
+
+def _request_stats():
+  if not has_request_context():
+    return None
+  return g.get('_sql_stats')
+
+
+def _caller():
+  """Último frame do pacote (fora deste módulo) na pilha atual"""
+
+  for frame in reversed(traceback.extract_stack()):
+    filename = os.path.abspath(frame.filename)
+    if filename.startswith(_PACKAGE_DIR) and filename != os.path.abspath(__file__):
+      return '%s:%d in %s' % (os.path.relpath(filename, os.path.dirname(_PACKAGE_DIR)), frame.lineno, frame.name)
+  return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault(_STARTS, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  elapsed = time.perf_counter() - conn.info[_STARTS].pop()
+
+  stats = _request_stats()
+  if stats is not None:
+    stats.statements += 1
+    stats.time += elapsed
+    if cursor.description is not None and cursor.rowcount > 0:
+      # O cursor padrão do PyMySQL é bufferizado, então o rowcount é o total de linhas lidas
+      stats.rows += cursor.rowcount
+
+    if not stats.batch:
+      stats.shapes[statement] += 1
+      if stats.shapes[statement] == Config.SQL_N_PLUS_ONE_THRESHOLD:
+        stats.repeated[statement] = _caller()
+
+  if Config.SQL_SLOW_QUERY_MS is not None and elapsed * 1000 >= Config.SQL_SLOW_QUERY_MS:
+    LOGGER.warning(
+      'Slow statement (%.1f ms) on %s: %s\nParameters: %r\nPlan:\n%s',
+      elapsed * 1000, _endpoint(), statement, _redact(parameters),
+      _explain(conn, statement, parameters) if not executemany else '-'
+    )
+
+
+def _handle_error(context):
+  """Descarta o início registrado pelo statement que falhou"""
+
+  if context.connection is None:
+    return
+
+  starts = context.connection.info.get(_STARTS)
+  if starts:
+    starts.pop()
+
+
+def _redact(parameters):
+  """Parâmetros sem os valores, ex.: (42, 'abc') -> (<int>, <str:3>)"""
+
+  if isinstance(parameters, dict):
+    return {key: _redact(value) for key, value in parameters.items()}
+  if isinstance(parameters, list):
+    return [_redact(value) for value in parameters]
+  if isinstance(parameters, tuple):
+    return tuple(_redact(value) for value in parameters)
+  if parameters is None:
+    return None
+  if isinstance(parameters, (str, bytes)):
+    return '<%s:%d>' % (type(parameters).__name__, len(parameters))
+  return '<%s>' % type(parameters).__name__
+
+
+def _explain(conn, statement, parameters):
+  if not statement.lstrip().upper().startswith('SELECT'):
+    return '-'
+
+  prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+  # Cursor DBAPI direto: não passa pelos eventos do engine
+  cursor = conn.connection.cursor()
+  try:
+    cursor.execute(prefix + statement, parameters)
+    return '\n'.join(' | '.join(str(value) for value in row) for row in cursor.fetchall())
+  except Exception as ex:
+    return 'EXPLAIN failed: %s' % ex
+  finally:
+    cursor.close()
+
+
+def _endpoint():
+  if not has_request_context():
+    return '-'
+  # Nome da classe para os recursos do flask-restful
+  view = current_app.view_functions.get(request.endpoint)
+  resource = getattr(getattr(view, 'view_class', None), '__name__', request.endpoint)
+  return '%s %s (%s)' % (request.method, request.path, resource)
+
+
+def report_request_stats(response):
+  """Registrado como `after_request`: adiciona o `Server-Timing`
+  e registra no log os padrões N+1."""
+
+  stats = _request_stats()
+  if stats is None:
+    return response
+
+  if Config.SQL_SERVER_TIMING:
+    response.headers.add(
+      'Server-Timing',
+      'db;dur=%.2f;desc="DB", db-statements;desc="%d", db-rows;desc="%d"' % (
+        stats.time * 1000, stats.statements, stats.rows
+      )
+    )
+
+  for statement, caller in stats.repeated.items():
+    LOGGER.warning(
+      'N+1: statement executed %d times on %s, from %s: %s',
+      stats.shapes[statement], _endpoint(), caller, statement
+    )
+
+  return response
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache():
+  """LRU limitado a `size` entradas, com expiração após `ttl` segundos
+  (ou no instante informado no `set`), seguro entre threads.
+
+  `generation()` é o token obtido antes de ler a origem: o `set` com um token
+  anterior à última invalidação (`invalidate`/`clear`) é descartado.
+  `on_evict(key, value)` é chamado (com o lock do cache) para as entradas
+  removidas (tamanho, expiração, `pop` e invalidações), mas não quando o
+  valor de uma chave é substituído.
+  """
+
+  def __init__(self, size, ttl=None, clock=time.monotonic, on_evict=None):
+    self.size = size
+    self.ttl = ttl
+    self.clock = clock
+    self.on_evict = on_evict
+    # chave -> (valor, expira em)
+    self.__items = OrderedDict()
+    self.__generation = 0
+    self.__lock = threading.Lock()
+
+  def __len__(self):
+    return len(self.__items)
+
+  def generation(self):
+    return self.__generation
+
+  def get(self, key, default=None):
+    with self.__lock:
+      item = self.__items.get(key)
+      if item is None:
+        return default
+
+      value, expires = item
+      if expires is not None and expires <= self.clock():
+        self.__drop(key)
+        return default
+
+      self.__items.move_to_end(key)
+      return value
+
+  def set(self, key, value, expires=None, generation=None):
+    """Retorna False quando o valor foi descartado pela geração"""
+
+    return self.update({key: value}, expires, generation)
+
+  def update(self, items, expires=None, generation=None):
+    if expires is None and self.ttl is not None:
+      expires = self.clock() + self.ttl
+
+    with self.__lock:
+      if generation is not None and generation != self.__generation:
+        return False
+
+      for key, value in items.items():
+        self.__items[key] = (value, expires)
+        self.__items.move_to_end(key)
+
+      while len(self.__items) > self.size:
+        self.__drop(next(iter(self.__items)))
+      return True
+
+  def pop(self, key, default=None):
+    with self.__lock:
+      item = self.__items.get(key)
+      if item is None:
+        return default
+      self.__drop(key)
+      return item[0]
+
+  def invalidate(self, keys):
+    with self.__lock:
+      self.__generation += 1
+      for key in keys:
+        if key in self.__items:
+          self.__drop(key)
+
+  def clear(self):
+    with self.__lock:
+      self.__generation += 1
+      for key in list(self.__items):
+        self.__drop(key)
+
+  def __drop(self, key):
+    value, expires = self.__items.pop(key)
+    if self.on_evict is not None:
+      self.on_evict(key, value)
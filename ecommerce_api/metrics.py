@@ -0,0 +1,336 @@
+"""
+Métricas no formato texto do Prometheus, expostas em `/metrics`.
+
+Cada processo (worker) mantém os valores em memória e os grava periodicamente
+em `METRICS_DIR/<pid>-<início>.json`. O `/metrics` soma os arquivos de todos os
+processos: contadores e histogramas de processos que já terminaram continuam
+somados (são monotônicos) e os gauges consideram apenas os processos vivos.
+O diretório deve ser limpo quando a aplicação é (re)implantada.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from sqlalchemy.pool import QueuePool
+
+from ecommerce_api.config import Config
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Metric():
+  type = None
+
+  def __init__(self, name, help, labels=()):
+    self.name = name
+    self.help = help
+    self.labels = tuple(labels)
+
+  def key(self, labels):
+    return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(_Metric):
+  type = 'counter'
+
+
+class Gauge(_Metric):
+  """Lido no momento da gravação pelo `collect`, que retorna {valores dos labels: valor}"""
+
+  type = 'gauge'
+
+  def __init__(self, name, help, labels=(), collect=None):
+    _Metric.__init__(self, name, help, labels)
+    self.collect = collect
+
+
+class Histogram(_Metric):
+  type = 'histogram'
+
+  def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    _Metric.__init__(self, name, help, labels)
+    self.buckets = tuple(sorted(buckets))
+
+
+class Registry():
+  def __init__(self, directory=None, flush_interval=1):
+    self.directory = directory
+    self.flush_interval = flush_interval
+    self.__metrics = {}
+    self.__values = {}
+    self.__lock = threading.Lock()
+    self.__pid = None
+    self.__path = None
+    self.__flushed = 0
+
+    if hasattr(os, 'register_at_fork'):
+      os.register_at_fork(after_in_child=self.__after_fork)
+
+  def __after_fork(self):
+    # Os valores herdados pertencem ao processo pai
+    self.__lock = threading.Lock()
+    self.__values = {}
+    self.__flushed = 0
+
+  def register(self, metric):
+    self.__metrics[metric.name] = metric
+    return metric
+
+  def counter(self, name, help, labels=()):
+    return self.register(Counter(name, help, labels))
+
+  def gauge(self, name, help, labels=(), collect=None):
+    return self.register(Gauge(name, help, labels, collect))
+
+  def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return self.register(Histogram(name, help, labels, buckets))
+
+  def inc(self, metric, amount=1, **labels):
+    key = metric.key(labels)
+    with self.__lock:
+      values = self.__values.setdefault(metric.name, {})
+      values[key] = values.get(key, 0) + amount
+
+  def observe(self, metric, value, **labels):
+    key = metric.key(labels)
+    with self.__lock:
+      values = self.__values.setdefault(metric.name, {})
+      entry = values.get(key)
+      if entry is None:
+        entry = values[key] = {'buckets': [0] * len(metric.buckets), 'sum': 0.0, 'count': 0}
+
+      for index, bound in enumerate(metric.buckets):
+        if value <= bound:
+          entry['buckets'][index] += 1
+          break
+      entry['sum'] += value
+      entry['count'] += 1
+
+  def __snapshot(self):
+    with self.__lock:
+      values = {
+        name: {key: (dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value)
+               for key, value in metric_values.items()}
+        for name, metric_values in self.__values.items()
+      }
+
+    for metric in self.__metrics.values():
+      if isinstance(metric, Gauge) and metric.collect is not None:
+        try:
+          values[metric.name] = {tuple(str(v) for v in key): value for key, value in metric.collect().items()}
+        except Exception as ex:
+          LOGGER.warning('Gauge %s not collected: %s', metric.name, ex)
+    return values
+
+  def __process_path(self):
+    if self.__pid != os.getpid():
+      self.__pid = os.getpid()
+      self.__path = os.path.join(self.directory, '%d-%d.json' % (self.__pid, time.time() * 1000))
+      atexit.register(self.flush)
+    return self.__path
+
+  def flush(self, force=True):
+    """Grava os valores do processo (no máximo a cada `flush_interval` se não `force`)"""
+
+    if not self.directory:
+      return
+
+    now = time.monotonic()
+    if not force and now - self.__flushed < self.flush_interval:
+      return
+    self.__flushed = now
+
+    path = self.__process_path()
+    values = self.__snapshot()
+    payload = {
+      'pid': os.getpid(),
+      'values': {name: [[list(key), value] for key, value in metric_values.items()]
+                 for name, metric_values in values.items()},
+    }
+
+    try:
+      os.makedirs(self.directory, exist_ok=True)
+      tmp = '%s.%d.tmp' % (path, threading.get_ident())
+      with open(tmp, 'w') as file:
+        json.dump(payload, file)
+      os.replace(tmp, path)
+    except OSError as ex:
+      LOGGER.warning('Metrics not written to %s: %s', path, ex)
+
+  def __processes(self):
+    if not self.directory:
+      yield True, {name: [[list(key), value] for key, value in metric_values.items()]
+                   for name, metric_values in self.__snapshot().items()}
+      return
+
+    self.flush()
+    for name in os.listdir(self.directory):
+      if not name.endswith('.json'):
+        continue
+      try:
+        with open(os.path.join(self.directory, name)) as file:
+          payload = json.load(file)
+      except (OSError, ValueError):
+        continue
+      yield _alive(payload['pid']), payload['values']
+
+  def aggregate(self):
+    totals = {}
+    for alive, values in self.__processes():
+      for name, entries in values.items():
+        metric = self.__metrics.get(name)
+        if metric is None or (isinstance(metric, Gauge) and not alive):
+          continue
+
+        metric_totals = totals.setdefault(name, {})
+        for key, value in entries:
+          key = tuple(key)
+          if isinstance(metric, Histogram):
+            total = metric_totals.setdefault(key, {'buckets': [0] * len(metric.buckets), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], value['buckets'])]
+            total['sum'] += value['sum']
+            total['count'] += value['count']
+          else:
+            metric_totals[key] = metric_totals.get(key, 0) + value
+    return totals
+
+  def exposition(self):
+    totals = self.aggregate()
+    lines = []
+    for name, metric in sorted(self.__metrics.items()):
+      lines.append('# HELP %s %s' % (name, metric.help))
+      lines.append('# TYPE %s %s' % (name, metric.type))
+      for key, value in sorted(totals.get(name, {}).items()):
+        labels = list(zip(metric.labels, key))
+        if isinstance(metric, Histogram):
+          cumulative = 0
+          for bound, count in zip(metric.buckets, value['buckets']):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (name, _labels(labels + [('le', _number(bound))]), cumulative))
+          lines.append('%s_bucket%s %d' % (name, _labels(labels + [('le', '+Inf')]), value['count']))
+          lines.append('%s_sum%s %s' % (name, _labels(labels), _number(value['sum'])))
+          lines.append('%s_count%s %d' % (name, _labels(labels), value['count']))
+        else:
+          lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+  if pid == os.getpid():
+    return True
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    pass
+  return True
+
+
+def _number(value):
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels):
+  if not labels:
+    return ''
+  escaped = [
+    '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+    for name, value in labels
+  ]
+  return '{%s}' % ','.join(escaped)
+
+
+registry = Registry(Config.METRICS_DIR, Config.METRICS_FLUSH_INTERVAL)
+
+REQUEST_DURATION = registry.histogram(
+  'http_request_duration_seconds', 'Request latency by route and method.', ('route', 'method')
+)
+REQUESTS = registry.counter('http_requests_total', 'Requests by route, method and status.', ('route', 'method', 'status'))
+SERIALIZATION = registry.histogram(
+  'serialization_duration_seconds', 'Time spent serializing resources.', ('resource',)
+)
+CACHE_REQUESTS = registry.counter('cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+POOL_WAIT = registry.histogram(
+  'db_pool_wait_seconds', 'Time waiting for a connection from the pool.', (),
+  buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+)
+
+_POOLS = []
+
+
+def _pool_stats(attribute):
+  def collect():
+    return {(str(index),): getattr(pool, attribute)() for index, pool in enumerate(_POOLS)}
+  return collect
+
+
+POOL_CHECKED_OUT = registry.gauge(
+  'db_pool_checked_out', 'Connections in use.', ('pool',), collect=_pool_stats('checkedout')
+)
+POOL_OVERFLOW = registry.gauge(
+  'db_pool_overflow', 'Connections opened above the pool size.', ('pool',), collect=_pool_stats('overflow')
+)
+
+
+class TimedQueuePool(QueuePool):
+  """QueuePool que registra o tempo de espera por uma conexão"""
+
+  def __init__(self, *args, **kwargs):
+    QueuePool.__init__(self, *args, **kwargs)
+    _POOLS.append(self)
+
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      return QueuePool._do_get(self)
+    finally:
+      registry.observe(POOL_WAIT, time.perf_counter() - start)
+
+  def recreate(self):
+    if self in _POOLS:
+      _POOLS.remove(self)
+    return QueuePool.recreate(self)
+
+
+def cache_lookup(name, hit):
+  registry.inc(CACHE_REQUESTS, cache=name, result='hit' if hit else 'miss')
+
+
+def start_request():
+  """Registrado como `before_request` (antes dos bulkheads, para incluir a espera na fila)"""
+
+  g._metrics_start = time.perf_counter()
+
+
+def end_request(response):
+  """Registrado como `after_request`"""
+
+  g._metrics_status = response.status_code
+  return response
+
+
+def record_request(exception=None):
+  """Registrado como `teardown_request`"""
+
+  start = g.pop('_metrics_start', None)
+  status = g.pop('_metrics_status', 500)
+  if start is None:
+    return
+
+  route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+  registry.observe(REQUEST_DURATION, time.perf_counter() - start, route=route, method=request.method)
+  registry.inc(REQUESTS, route=route, method=request.method, status=status)
+  registry.flush(force=False)
+
+
+def metrics():
+  return Response(registry.exposition(), mimetype=CONTENT_TYPE)
@@ -1,3 +1,6 @@
 from .product import Product
 from .coupon import Coupon
-from .user import User
\ No newline at end of file
+from .user import User
+
+# Listeners do `Product.effective_price` (depende dos modelos acima)
+from . import effective_price
@@ -1,5 +1,8 @@
 from datetime import datetime
 from sqlalchemy import Column, DateTime, event, Integer
+from sqlalchemy.dialects import mysql
+
+from ecommerce_api import cache
 
 
 class ModelBase():
@@ -11,12 +14,17 @@ class ModelBase():
   id = Column(Integer, primary_key=True, autoincrement=True)
 
 
+# Com microssegundos no MySQL: o `updated_at` compõe o ETag, que não pode
+# ser o mesmo para duas alterações no mesmo segundo
+AUDIT_DATETIME = DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+
 class AuditedModelBase():
   """Define as colunas utilizadas para autoria nos registros da base
   """
 
-  created_at = Column(DateTime, nullable=False)
-  updated_at = Column(DateTime, nullable=True)
+  created_at = Column(AUDIT_DATETIME, nullable=False)
+  updated_at = Column(AUDIT_DATETIME, nullable=True)
 
   @staticmethod
   def audit_on_insert(mapper, connection, target):
@@ -29,7 +37,27 @@ class AuditedModelBase():
   def audit_on_update(mapper, connection, target):
       target.updated_at = datetime.utcnow()
 
+  @staticmethod
+  def invalidate_on_change(mapper, connection, target):
+      cache.mark_resource_changed(target)
+
+  @staticmethod
+  def invalidate_on_link(target, value, initiator):
+      """Alterações nas tabelas de associação (ex.: `products_coupons`)
+      invalidam os dois lados da relação"""
+      cache.mark_resource_changed(target)
+      if value is not None:
+          cache.mark_resource_changed(value)
+
   @classmethod
   def __declare_last__(cls):
     event.listen(cls, 'before_insert', cls.audit_on_insert)
     event.listen(cls, 'before_update', cls.audit_on_update)
+    event.listen(cls, 'after_insert', cls.invalidate_on_change)
+    event.listen(cls, 'after_update', cls.invalidate_on_change)
+    event.listen(cls, 'after_delete', cls.invalidate_on_change)
+
+    for relationship in cls.__mapper__.relationships:
+      if relationship.secondary is not None:
+        event.listen(getattr(cls, relationship.key), 'append', cls.invalidate_on_link)
+        event.listen(getattr(cls, relationship.key), 'remove', cls.invalidate_on_link)
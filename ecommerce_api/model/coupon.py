@@ -6,7 +6,7 @@ from ecommerce_api.resources import db
 
 
 class Coupon(AuditedModelBase, ModelBase, db.Model):
-  code = Column(String(64), nullable=False)
+  code = Column(String(64), nullable=False, unique=True, index=True)
   discount_percent = Column(DECIMAL(
     precision=15, scale=2, asdecimal=False
   ))
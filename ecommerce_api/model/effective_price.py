@@ -0,0 +1,136 @@
+"""
+Manutenção do `Product.effective_price`: o preço com o melhor desconto entre
+os cupons associados em `products_coupons`.
+
+É recalculado no `before_commit`, apenas para os produtos afetados: os produtos
+alterados na transação (as mesmas chaves que invalidam o cache de entidades,
+registradas pelo ORM, pelas operações em lote e pela action de cupons, que
+também cobrem as associações) e os produtos dos cupons com desconto alterado
+ou removidos.
+"""
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.orm import Session
+
+from ecommerce_api import cache
+from ecommerce_api.model.coupon import Coupon
+from ecommerce_api.model.product import Product, products_coupons
+
+CENTS = Decimal('0.01')
+CHUNK = 1000
+
+# Cupons com desconto alterado na transação (`session.info`)
+_COUPONS = 'effective_price_coupons'
+
+
+def money(value):
+  return Decimal(str(value or 0)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def coupon_discount(unit_price, discount_percent, discount_value):
+  """Desconto por unidade de um cupom: o maior entre o percentual
+  e o valor, limitado ao preço"""
+
+  unit_price = money(unit_price)
+  discount = max(money(unit_price * Decimal(str(discount_percent or 0)) / 100), money(discount_value))
+  return min(discount, unit_price)
+
+
+def effective_price(price, coupons):
+  """Preço com o melhor desconto entre `coupons` ((percentual, valor), ...)"""
+
+  price = money(price)
+  best = max((coupon_discount(price, percent, value) for percent, value in coupons), default=Decimal('0.00'))
+  return price - best
+
+
+def refresh(session, product_ids):
+  """Recalcula o `effective_price` dos produtos, em lotes. Os produtos com o
+  valor alterado têm o `updated_at` atualizado (ETag/Last-Modified) e as
+  entradas do cache invalidadas no commit."""
+
+  product = Product.__table__
+  coupon = Coupon.__table__
+  update = product.update() \
+    .where(product.c.id == bindparam('_id')) \
+    .values(effective_price=bindparam('_effective_price'), updated_at=bindparam('_updated_at'))
+
+  product_ids = sorted(product_ids)
+  for start in range(0, len(product_ids), CHUNK):
+    ids = product_ids[start:start + CHUNK]
+
+    rows = session.execute(
+      select([product.c.id, product.c.price, product.c.effective_price]).where(product.c.id.in_(ids))
+    ).fetchall()
+    links = session.execute(
+      select([products_coupons.c.product_id, coupon.c.discount_percent, coupon.c.discount_value])
+      .select_from(products_coupons.join(coupon, coupon.c.id == products_coupons.c.coupon_id))
+      .where(products_coupons.c.product_id.in_(ids))
+    ).fetchall()
+
+    coupons = {}
+    for product_id, percent, value in links:
+      coupons.setdefault(product_id, []).append((percent, value))
+
+    now = datetime.utcnow()
+    changes = []
+    for id, price, current in rows:
+      value = effective_price(price, coupons.get(id, ()))
+      if current is None or money(current) != value:
+        changes.append({'_id': id, '_effective_price': value, '_updated_at': now})
+
+    if changes:
+      session.execute(update, changes)
+      cache.mark_changed(session, [(product.name, str(change['_id'])) for change in changes])
+
+
+def _products_of_coupons(session, coupon_ids):
+  if not coupon_ids:
+    return set()
+
+  query = select([products_coupons.c.product_id]).where(products_coupons.c.coupon_id.in_(sorted(coupon_ids)))
+  return {product_id for product_id, in session.execute(query)}
+
+
+@event.listens_for(Product, 'before_insert')
+def _price_on_insert(mapper, connection, target):
+  if target.effective_price is None:
+    target.effective_price = money(target.price)
+
+
+@event.listens_for(Coupon, 'after_update')
+def _discount_changed(mapper, connection, target):
+  state = inspect(target)
+  if state.attrs.discount_percent.history.has_changes() or state.attrs.discount_value.history.has_changes():
+    state.session.info.setdefault(_COUPONS, set()).add(target.id)
+
+
+@event.listens_for(Session, 'before_flush')
+def _coupons_deleted(session, flush_context, instances):
+  """As associações dos cupons removidos são apagadas no flush,
+  então os produtos são registrados antes."""
+
+  ids = {resource.id for resource in session.deleted if isinstance(resource, Coupon) and resource.id is not None}
+  if ids:
+    products = _products_of_coupons(session, ids)
+    cache.mark_changed(session, [(Product.__table__.name, str(id)) for id in products])
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_before_commit(session):
+  # O flush final do commit acontece depois deste evento
+  session.flush()
+
+  coupon_ids = session.info.pop(_COUPONS, set())
+  product_ids = {int(id) for table, id in cache.pending_changes(session) if table == Product.__table__.name}
+  product_ids |= _products_of_coupons(session, coupon_ids)
+
+  if product_ids:
+    refresh(session, product_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+  session.info.pop(_COUPONS, None)
@@ -11,8 +11,10 @@ from ecommerce_api.resources import db
 
 products_coupons = db.Table(
   'products_coupons',
-  db.Column('product_id', db.Integer(), db.ForeignKey('product.id')),
-  db.Column('coupon_id', db.Integer(), db.ForeignKey('coupon.id'))
+  db.Column('product_id', db.Integer(), db.ForeignKey('product.id'), primary_key=True),
+  db.Column('coupon_id', db.Integer(), db.ForeignKey('coupon.id'), primary_key=True),
+  # A chave primária atende as buscas a partir do produto e este índice as a partir do cupom
+  db.Index('ix_products_coupons_coupon_id_product_id', 'coupon_id', 'product_id')
 )
 
 
@@ -22,5 +24,9 @@ class Product(AuditedModelBase, ModelBase, db.Model):
   price = Column(DECIMAL(
     precision=15, scale=2, asdecimal=False
   ), nullable=False)
+  # Preço com o melhor desconto dos cupons (mantido pelo `model.effective_price`)
+  effective_price = Column(DECIMAL(
+    precision=15, scale=2, asdecimal=False
+  ), nullable=False, index=True)
 
   coupons = relationship('Coupon', secondary=products_coupons)
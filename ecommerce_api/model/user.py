@@ -5,5 +5,5 @@ from ecommerce_api.resources import db
 
 
 class User(AuditedModelBase, ModelBase, db.Model):
-  username = Column(String(128))
+  username = Column(String(128), unique=True, index=True)
   password = Column(String(128))
@@ -0,0 +1,142 @@
+"""
+Índice em memória dos preços dos produtos, dos cupons e das associações
+produto/cupom, usado no cálculo dos carrinhos.
+
+Os produtos são carregados sob demanda, em lote (um IN por tabela), e mantidos
+em um LRU por até `PRICING_INDEX_TTL` segundos. As entradas são descartadas pelas
+invalidações do cache de entidades (`cache.add_invalidation_listener`), que cobrem
+as alterações pelo ORM, pelas operações em lote e pela action de cupons, inclusive
+as de outros processos.
+"""
+from decimal import Decimal
+
+from ecommerce_api import cache
+from ecommerce_api.config import Config
+from ecommerce_api.lru import LRUCache
+from ecommerce_api.model import Coupon, Product
+from ecommerce_api.model.effective_price import coupon_discount, money
+from ecommerce_api.model.product import products_coupons
+
+
+class PricingIndex():
+  def __init__(self, size=100000, ttl=60):
+    # product id -> (preço, ids dos cupons)
+    self.__products = LRUCache(size, ttl)
+    # coupon id -> (código, percentual, valor)
+    self.__coupons = LRUCache(size, ttl)
+
+  def invalidate(self, keys):
+    self.__products.invalidate([int(id) for table, id in keys if table == Product.__table__.name])
+    self.__coupons.invalidate([int(id) for table, id in keys if table == Coupon.__table__.name])
+
+  def products(self, session, ids):
+    """{id: (preço, ids dos cupons)} dos produtos existentes entre `ids`"""
+
+    generation = self.__products.generation()
+    found, missing = {}, []
+    for id in ids:
+      entry = self.__products.get(id)
+      if entry is None:
+        missing.append(id)
+      else:
+        found[id] = entry
+
+    if not missing:
+      return found
+
+    loaded = {
+      id: (money(price), set())
+      for id, price in session.query(Product.id, Product.price).filter(Product.id.in_(missing))
+    }
+    rows = session.query(products_coupons.c.product_id, products_coupons.c.coupon_id) \
+      .filter(products_coupons.c.product_id.in_(list(loaded)))
+    for product_id, coupon_id in rows:
+      loaded[product_id][1].add(coupon_id)
+
+    loaded = {id: (price, frozenset(coupon_ids)) for id, (price, coupon_ids) in loaded.items()}
+    found.update(loaded)
+
+    # Descarta o que foi lido durante uma invalidação
+    self.__products.update(loaded, generation=generation)
+
+    return found
+
+  def coupons(self, session, ids):
+    """{id: (código, percentual, valor)} dos cupons existentes entre `ids`"""
+
+    generation = self.__coupons.generation()
+    found = {}
+    for id in ids:
+      entry = self.__coupons.get(id)
+      if entry is not None:
+        found[id] = entry
+
+    missing = [id for id in ids if id not in found]
+    if not missing:
+      return found
+
+    query = session.query(Coupon.id, Coupon.code, Coupon.discount_percent, Coupon.discount_value) \
+      .filter(Coupon.id.in_(missing))
+    loaded = {id: (code, percent, value) for id, code, percent, value in query}
+    found.update(loaded)
+
+    self.__coupons.update(loaded, generation=generation)
+
+    return found
+
+  def price(self, session, items, codes=None):
+    """Preço de cada linha (`items` é uma lista de (product id, quantidade))
+    com o melhor desconto entre os cupons do produto, limitados aos
+    `codes` quando informados. A regra do desconto é a mesma do
+    `Product.effective_price`.
+
+    Levanta `KeyError` com os ids dos produtos que não existem."""
+
+    products = self.products(session, {id for id, _ in items})
+    unknown = sorted({id for id, _ in items if id not in products})
+    if unknown:
+      raise KeyError(unknown)
+
+    coupons = self.coupons(session, set().union(*(coupon_ids for _, coupon_ids in products.values())))
+    if codes is not None:
+      codes = set(codes)
+      coupons = {id: coupon for id, coupon in coupons.items() if coupon[0] in codes}
+
+    lines = []
+    subtotal = discount = Decimal('0.00')
+    for product_id, quantity in items:
+      unit_price, coupon_ids = products[product_id]
+
+      best, best_code = Decimal('0.00'), None
+      for coupon_id in coupon_ids:
+        coupon = coupons.get(coupon_id)
+        if coupon is None:
+          continue
+        code, percent, value = coupon
+        unit_discount = coupon_discount(unit_price, percent, value)
+        if unit_discount > best or (unit_discount == best and best_code is not None and code < best_code):
+          best, best_code = unit_discount, code
+
+      line_subtotal = unit_price * quantity
+      line_discount = best * quantity
+      subtotal += line_subtotal
+      discount += line_discount
+      lines.append({
+        'id': product_id,
+        'quantity': quantity,
+        'unit_price': str(unit_price),
+        'coupon': best_code,
+        'discount': str(line_discount),
+        'total': str(line_subtotal - line_discount),
+      })
+
+    return {
+      'lines': lines,
+      'subtotal': str(subtotal),
+      'discount': str(discount),
+      'total': str(subtotal - discount),
+    }
+
+
+index = PricingIndex(Config.PRICING_INDEX_SIZE, Config.PRICING_INDEX_TTL)
+cache.add_invalidation_listener(index.invalidate)
@@ -0,0 +1,140 @@
+"""
+Profiling por amostragem das requests (opt-in, `PROFILER_ENABLED=1`).
+
+É perfilada uma request a cada `PROFILER_SAMPLE_RATE` (0 desabilita a amostragem)
+ou qualquer request com o header `PROFILER_HEADER` assinado (ver `debug_token`).
+Cada request perfilada gera, em `PROFILER_DIR/<endpoint>.<método>/`:
+
+- `<id>.prof`: dump do cProfile (pstats, snakeviz, gprof2dot, flameprof)
+- `<id>.folded`: os spans nomeados no formato de pilhas colapsadas do flamegraph.pl,
+  com o tempo próprio de cada span em microssegundos
+"""
+import cProfile
+import hashlib
+import hmac
+import itertools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from ecommerce_api.config import Config
+
+LOGGER = logging.getLogger(__name__)
+
+_REQUESTS = itertools.count(1)
+_SEQUENCE = itertools.count(1)
+
+
+class _Span():
+  def __init__(self, path):
+    self.path = path
+    self.start = time.perf_counter()
+    self.children = 0.0
+
+
+class _ProfileState():
+  def __init__(self):
+    self.profile = cProfile.Profile()
+    self.root = _Span(())
+    self.stack = [self.root]
+    self.folded = {}
+
+  def close(self, span):
+    elapsed = time.perf_counter() - span.start
+    own = max(elapsed - span.children, 0.0)
+    self.folded[span.path] = self.folded.get(span.path, 0.0) + own
+    return elapsed
+
+
+def _sign(expires):
+  return hmac.new(Config.SECRET_KEY.encode('utf-8'), str(expires).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def debug_token(ttl=300):
+  """Valor do header que habilita o profiling até `ttl` segundos a partir de agora"""
+
+  expires = int(time.time()) + ttl
+  return '%d.%s' % (expires, _sign(expires))
+
+
+def _valid_token(token):
+  try:
+    expires, signature = token.split('.', 1)
+    expires = int(expires)
+  except ValueError:
+    return False
+
+  return expires >= time.time() and hmac.compare_digest(signature, _sign(expires))
+
+
+def _sampled():
+  token = request.headers.get(Config.PROFILER_HEADER)
+  if token and Config.SECRET_KEY and _valid_token(token):
+    return True
+
+  rate = Config.PROFILER_SAMPLE_RATE
+  return bool(rate) and next(_REQUESTS) % rate == 0
+
+
+def start_request():
+  """Registrado como `before_request`"""
+
+  g._profile = None
+  if not _sampled():
+    return
+
+  state = _ProfileState()
+  g._profile = state
+  state.profile.enable()
+
+
+def end_request(exception=None):
+  """Registrado como `teardown_request`"""
+
+  state = g.pop('_profile', None)
+  if state is None:
+    return
+
+  state.profile.disable()
+  while len(state.stack) > 1:
+    state.close(state.stack.pop())
+  elapsed = state.close(state.root)
+
+  endpoint = '%s.%s' % (request.endpoint or 'unmatched', request.method)
+  directory = os.path.join(Config.PROFILER_DIR, endpoint)
+  name = '%d-%d-%d' % (time.time() * 1000, os.getpid(), next(_SEQUENCE))
+
+  try:
+    os.makedirs(directory, exist_ok=True)
+    state.profile.dump_stats(os.path.join(directory, name + '.prof'))
+    with open(os.path.join(directory, name + '.folded'), 'w') as file:
+      for path, seconds in state.folded.items():
+        file.write('%s %d\n' % (';'.join((endpoint,) + path), seconds * 1000000))
+  except OSError as ex:
+    LOGGER.warning('Profile of %s not written: %s', endpoint, ex)
+    return
+
+  LOGGER.info('Profiled %s %s (%.1f ms): %s', request.method, request.path, elapsed * 1000, os.path.join(directory, name))
+
+
+@contextmanager
+def span(name):
+  """Trecho nomeado nos profiles (sem custo relevante quando a request não é perfilada)"""
+
+  state = g.get('_profile') if has_request_context() else None
+  if state is None:
+    yield
+    return
+
+  parent = state.stack[-1]
+  current = _Span(parent.path + (name,))
+  state.stack.append(current)
+  try:
+    yield
+  finally:
+    if state.stack and state.stack[-1] is current:
+      state.stack.pop()
+      parent.children += state.close(current)
@@ -1,4 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import orm
 
+from ecommerce_api import instrumentation, metrics, routing
 
-db = SQLAlchemy()
+
+class _SQLAlchemy(SQLAlchemy):
+  def create_engine(self, sa_url, engine_opts):
+    if sa_url.get_backend_name() != 'sqlite':
+      engine_opts.setdefault('poolclass', metrics.TimedQueuePool)
+    engine = super().create_engine(sa_url, engine_opts)
+    instrumentation.instrument(engine)
+    return engine
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=routing.RoutingSession, db=self, **options)
+
+
+db = _SQLAlchemy()
@@ -0,0 +1,198 @@
+"""
+Roteamento das leituras para as réplicas do banco.
+
+As requests GET/HEAD usam uma réplica (`DATABASE_REPLICA_URLS`, registradas como
+binds `replica_<n>`) escolhida por round-robin ou pela que tem menos conexões em uso.
+Ficam no primário:
+
+- requests de escrita e tudo o que a sessão executa depois de um flush na mesma request
+- as leituras de um cliente até `REPLICA_STALENESS_WINDOW` segundos após uma escrita
+  dele: as respostas das escritas levam o instante da escrita no cookie e no header
+  `REPLICA_WRITE_MARKER`, que o cliente devolve nas requests seguintes (para qualquer
+  processo ou máquina), além do registro no próprio processo
+- o que é executado fora de uma request (comandos, threads)
+"""
+import itertools
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+
+from ecommerce_api import cache
+from ecommerce_api.config import Config
+from ecommerce_api.lru import LRUCache
+
+ROUND_ROBIN = 'round_robin'
+LEAST_CONNECTIONS = 'least_connections'
+
+_READ_METHODS = ('GET', 'HEAD')
+
+# Chaves no `session.info`
+_PRIMARY = 'routing_primary'
+_REPLICA = 'routing_replica'
+_WROTE = 'routing_wrote'
+
+
+def replica_binds(app):
+  return sorted(key for key in (app.config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('replica_'))
+
+
+class _Selector():
+  def __init__(self):
+    self.__next = itertools.count()
+    self.__in_use = {}
+    self.__tracked = set()
+    self.__lock = threading.Lock()
+
+  def track(self, key, engine):
+    if key in self.__tracked:
+      return
+
+    with self.__lock:
+      if key in self.__tracked:
+        return
+      self.__in_use.setdefault(key, 0)
+      event.listen(engine, 'checkout', lambda *args: self.__count(key, 1))
+      event.listen(engine, 'checkin', lambda *args: self.__count(key, -1))
+      self.__tracked.add(key)
+
+  def __count(self, key, delta):
+    with self.__lock:
+      self.__in_use[key] += delta
+
+  def select(self, keys, strategy):
+    if strategy == LEAST_CONNECTIONS:
+      with self.__lock:
+        return min(keys, key=lambda key: (self.__in_use.get(key, 0), key))
+    return keys[next(self.__next) % len(keys)]
+
+
+class _RecentWriters():
+  """Clientes que escreveram há menos de `window` segundos (LRU limitado)"""
+
+  def __init__(self, window, size=10000):
+    self.window = window
+    self.__items = LRUCache(size, window)
+
+  def add(self, client):
+    self.__items.set(client, True)
+
+  def __contains__(self, client):
+    return self.__items.get(client, False)
+
+
+_SELECTOR = _Selector()
+_RECENT_WRITERS = _RecentWriters(Config.REPLICA_STALENESS_WINDOW)
+
+
+def _client():
+  from ecommerce_api.api.auth import get_auth_data
+
+  auth_data = get_auth_data()
+  if auth_data and auth_data.get('user'):
+    return 'user:%s' % auth_data['user'].get('id')
+  return 'addr:%s' % request.remote_addr
+
+
+def _wrote_recently():
+  marker = request.headers.get(Config.REPLICA_WRITE_MARKER) or request.cookies.get(Config.REPLICA_WRITE_MARKER)
+  try:
+    wrote_at = float(marker)
+  except (TypeError, ValueError):
+    return False
+  return 0 <= time.time() - wrote_at <= Config.REPLICA_STALENESS_WINDOW
+
+
+def _replica_key(session):
+  if not has_request_context() or request.method not in _READ_METHODS:
+    return None
+
+  # O flush vai sempre para o primário, mesmo depois de uma leitura na réplica
+  # (o `after_flush` fixa a sessão no primário)
+  if session.info.get(_PRIMARY) or session._flushing:
+    return None
+
+  key = session.info.get(_REPLICA)
+  if key is not None:
+    return key
+
+  keys = replica_binds(session.app)
+  if not keys:
+    return None
+
+  if session.new or session.dirty or session.deleted or _wrote_recently() or _client() in _RECENT_WRITERS:
+    session.info[_PRIMARY] = True
+    return None
+
+  key = _SELECTOR.select(keys, Config.REPLICA_STRATEGY)
+  session.info[_REPLICA] = key
+  return key
+
+
+def replica_of(session):
+  """Bind da réplica usada pela sessão na request atual ou None"""
+
+  return session.info.get(_REPLICA)
+
+
+def may_cache(session):
+  """Se o que a sessão leu pode ser guardado nos caches do processo: a réplica
+  pode ainda não ter recebido uma alteração invalidada há pouco"""
+
+  if replica_of(session) is None:
+    return True
+
+  invalidated_at = cache.entity_cache.invalidated_at()
+  return invalidated_at is None or time.monotonic() - invalidated_at > Config.REPLICA_STALENESS_WINDOW
+
+
+def reset_request_routing(session):
+  for key in (_PRIMARY, _REPLICA, _WROTE):
+    session.info.pop(key, None)
+
+
+class RoutingSession(SignallingSession):
+  def __init__(self, db, autocommit=False, autoflush=True, **options):
+    self.db = db
+    SignallingSession.__init__(self, db, autocommit=autocommit, autoflush=autoflush, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    key = _replica_key(self)
+    if key is None:
+      return SignallingSession.get_bind(self, mapper, clause)
+
+    engine = self.db.get_engine(self.app, bind=key)
+    _SELECTOR.track(key, engine)
+    return engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_flush(session, flush_context):
+  session.info[_PRIMARY] = True
+  session.info[_WROTE] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_writer(session):
+  wrote = session.info.pop(_WROTE, False)
+  if not has_request_context():
+    return
+
+  if wrote or request.method not in _READ_METHODS:
+    _RECENT_WRITERS.add(_client())
+    g._routing_wrote_at = time.time()
+
+
+def mark_write(response):
+  """Registrado como `after_request`: devolve ao cliente o instante da escrita"""
+
+  wrote_at = g.pop('_routing_wrote_at', None)
+  if wrote_at is not None:
+    value = '%.3f' % wrote_at
+    response.headers[Config.REPLICA_WRITE_MARKER] = value
+    response.set_cookie(
+      Config.REPLICA_WRITE_MARKER, value, max_age=Config.REPLICA_STALENESS_WINDOW, httponly=True
+    )
+  return response
@@ -0,0 +1,347 @@
+"""
+Busca textual nos produtos (`?q=`) com um índice invertido em memória sobre
+`Product.name` e `Product.description`.
+
+O índice de cada processo é construído em uma thread, iniciada na primeira
+requisição (`start`, registrado como `before_request`), que lê os produtos em
+lotes por uma conexão própria; até ficar pronto as buscas respondem 503.
+A construção é abandonada quando o índice passa de `max_postings` entradas
+(palavra, produto), o limite de memória do índice.
+
+Depois de pronto, o índice é mantido de forma incremental: as inserções,
+alterações e remoções pelo ORM (e as operações em lote) geram as chaves de
+invalidação do cache de entidades (`cache.add_invalidation_listener`), inclusive
+as dos outros processos, e os produtos alterados são relidos em uma única
+consulta antes da próxima busca. Para limitar o efeito de uma invalidação
+perdida (ex.: alteração direta no banco), o índice é reconstruído em segundo
+plano a cada `max_age` segundos e trocado quando o novo fica pronto.
+
+Os termos da consulta são combinados com AND. Cada termo casa com a palavra exata
+ou, com peso menor, com as palavras que começam com ele (prefixo). A relevância
+segue o BM25 (sem normalização pelo tamanho), com as palavras do nome valendo
+`NAME_WEIGHT` vezes as da descrição.
+"""
+import bisect
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import select
+
+from ecommerce_api import cache, routing
+from ecommerce_api.config import Config
+from ecommerce_api.model import Product
+
+LOGGER = logging.getLogger(__name__)
+
+CHUNK = 10000
+NAME_WEIGHT = 3
+PREFIX_FACTOR = 0.5
+K1 = 1.2
+
+_WORDS = re.compile(r'\w+')
+
+
+class Unavailable(Exception):
+  """O índice do processo ainda não está pronto (ou passou do limite de memória)"""
+
+
+def tokenize(text):
+  """Palavras do texto em minúsculas e sem acentos"""
+
+  if not text:
+    return []
+
+  text = text.lower()
+  if not text.isascii():
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+  return _WORDS.findall(text)
+
+
+def _idf(total, frequency):
+  return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+
+def _weights(name, description):
+  weights = {}
+  for term in tokenize(name):
+    weights[term] = weights.get(term, 0) + NAME_WEIGHT
+  for term in tokenize(description):
+    weights[term] = weights.get(term, 0) + 1
+  return weights
+
+
+class _Postings():
+  """Índice invertido de um conjunto de produtos (sem lock próprio)"""
+
+  def __init__(self, prefix_expansions):
+    self.prefix_expansions = prefix_expansions
+    # termo -> {peso: product ids}
+    self.postings = {}
+    # product id -> {termo: peso}
+    self.documents = {}
+    # Termos ordenados, para a busca por prefixo (pode conter termos sem postings)
+    self.terms = []
+    # Quantidade de entradas (termo, produto)
+    self.size = 0
+
+  def finish(self):
+    self.terms = sorted(self.postings)
+
+  def add(self, id, weights, sort=True):
+    for term, weight in weights.items():
+      buckets = self.postings.get(term)
+      if buckets is None:
+        buckets = self.postings[term] = {}
+        if sort:
+          position = bisect.bisect_left(self.terms, term)
+          if position == len(self.terms) or self.terms[position] != term:
+            self.terms.insert(position, term)
+      buckets.setdefault(weight, set()).add(id)
+    self.documents[id] = weights
+    self.size += len(weights)
+
+  def remove(self, id):
+    weights = self.documents.pop(id, {})
+    self.size -= len(weights)
+    for term, weight in weights.items():
+      buckets = self.postings.get(term)
+      if buckets is None:
+        continue
+      ids = buckets.get(weight)
+      if ids is not None:
+        ids.discard(id)
+        if not ids:
+          del buckets[weight]
+      if not buckets:
+        del self.postings[term]
+
+  def expansions(self, token):
+    """(termo, fator) que casam com o token: o exato e os primeiros por prefixo"""
+
+    expansions = []
+    if token in self.postings:
+      expansions.append((token, 1.0))
+
+    position = bisect.bisect_right(self.terms, token)
+    prefixed = 0
+    while position < len(self.terms) and prefixed < self.prefix_expansions:
+      term = self.terms[position]
+      if not term.startswith(token):
+        break
+      if term in self.postings:
+        expansions.append((term, PREFIX_FACTOR))
+        prefixed += 1
+      position += 1
+
+    return expansions
+
+  def token_groups(self, token, total):
+    """{pontuação: ids} dos produtos que casam com o token, com a maior
+    pontuação entre os termos, e a quantidade de produtos. O idf é o do
+    token (todos os produtos que casam), para a palavra exata valer mais
+    que as por prefixo."""
+
+    scored = []
+    for term, factor in self.expansions(token):
+      for weight, ids in self.postings[term].items():
+        scored.append((factor * weight * (K1 + 1) / (weight + K1), ids))
+    scored.sort(key=lambda item: -item[0])
+
+    groups, seen = {}, set()
+    for score, ids in scored:
+      ids = ids - seen
+      if ids:
+        groups[score] = groups[score] | ids if score in groups else ids
+        seen |= ids
+
+    idf = _idf(total, len(seen))
+    return {score * idf: ids for score, ids in groups.items()}, len(seen)
+
+  def search(self, tokens, limit):
+    # A pontuação de um token depende apenas do peso do termo no produto, então os
+    # produtos são agrupados por pontuação e o AND é feito com interseções dos grupos
+    total = len(self.documents)
+    matches = [self.token_groups(token, total) for token in tokens]
+    if not all(size for groups, size in matches):
+      return []
+
+    # Começa pelo token com menos produtos
+    matches.sort(key=lambda item: item[1])
+
+    groups = matches[0][0]
+    for other, size in matches[1:]:
+      combined = {}
+      for score, ids in groups.items():
+        for other_score, other_ids in other.items():
+          both = ids & other_ids
+          if both:
+            key = score + other_score
+            combined[key] = combined[key] | both if key in combined else both
+      groups = combined
+      if not groups:
+        return []
+
+    result = []
+    for score in sorted(groups, reverse=True):
+      result.extend(heapq.nsmallest(limit - len(result), groups[score]))
+      if len(result) >= limit:
+        break
+    return result
+
+
+class SearchIndex():
+  def __init__(self, prefix_expansions=50, max_postings=5000000, max_age=3600):
+    self.prefix_expansions = prefix_expansions
+    self.max_postings = max_postings
+    self.max_age = max_age
+    # Índice pronto (None até a primeira construção terminar)
+    self.__postings = None
+    # Produtos alterados desde a última leitura
+    self.__stale = set()
+    # Produtos alterados durante a construção em andamento (None sem construção)
+    self.__building = None
+    # Instante (monotônico) do início da última construção, pronta ou abandonada
+    self.__built_at = None
+    self.__pid = None
+    self.__ready = threading.Event()
+    self.__lock = threading.Lock()
+    # Releituras em série, para uma leitura antiga não sobrescrever uma recente
+    self.__update_lock = threading.Lock()
+
+  def start(self, app):
+    """Inicia a construção do índice do processo (também após um fork)
+    ou a reconstrução quando o índice passou de `max_age`"""
+
+    now = time.monotonic()
+    pid = os.getpid()
+    with self.__lock:
+      if self.__pid == pid:
+        if self.__building is not None or now - self.__built_at < self.max_age:
+          return
+      else:
+        # O índice e a thread do processo pai não são do processo atual
+        self.__pid = pid
+        self.__postings = None
+        self.__stale = set()
+        self.__ready = threading.Event()
+
+      self.__building = set()
+      self.__built_at = now
+
+    threading.Thread(target=self.__build, args=(app,), name='search-index', daemon=True).start()
+
+  def wait(self, timeout=None):
+    """Aguarda o índice do processo ficar pronto (ex.: antes de um benchmark)"""
+
+    return self.__ready.wait(timeout)
+
+  def invalidate(self, keys):
+    ids = {int(id) for table, id in keys if table == Product.__table__.name}
+    if ids:
+      with self.__lock:
+        self.__stale.update(ids)
+        if self.__building is not None:
+          self.__building.update(ids)
+
+  def search(self, session, q, limit):
+    """Ids dos `limit` produtos mais relevantes para `q`, em ordem de relevância"""
+
+    tokens = list(dict.fromkeys(tokenize(q)))
+    if not tokens:
+      return []
+
+    if self.__postings is None:
+      raise Unavailable()
+
+    if self.__stale:
+      with self.__update_lock:
+        self.__reload(session)
+
+    with self.__lock:
+      if self.__postings is None:
+        raise Unavailable()
+      return self.__postings.search(tokens, limit)
+
+  def __build(self, app):
+    from ecommerce_api.resources import db
+
+    product = Product.__table__
+    postings = _Postings(self.prefix_expansions)
+    last_id = 0
+    try:
+      with app.app_context(), db.get_engine(app).connect() as connection:
+        while True:
+          rows = connection.execute(
+            select([product.c.id, product.c.name, product.c.description])
+            .where(product.c.id > last_id).order_by(product.c.id).limit(CHUNK)
+          ).fetchall()
+          if not rows:
+            break
+
+          for id, name, description in rows:
+            postings.add(id, _weights(name, description), sort=False)
+          if postings.size > self.max_postings:
+            LOGGER.error("Search index exceeds %d postings, search disabled", self.max_postings)
+            postings = None
+            break
+          last_id = rows[-1][0]
+    except Exception:
+      LOGGER.exception("Search index build failed")
+      postings = None
+
+    if postings is not None:
+      postings.finish()
+
+    with self.__lock:
+      changed, self.__building = self.__building, None
+      if postings is None:
+        # Mantém o índice anterior, se houver; nova tentativa após `max_age`
+        return
+
+      # As alterações durante a leitura são relidas na próxima busca
+      self.__stale.update(changed)
+      self.__postings = postings
+      self.__ready.set()
+    LOGGER.info("Search index built (%d products)", len(postings.documents))
+
+  def __reload(self, session):
+    with self.__lock:
+      ids, self.__stale = self.__stale, set()
+
+    if not ids:
+      return
+
+    product = Product.__table__
+    rows = session.execute(
+      select([product.c.id, product.c.name, product.c.description]).where(product.c.id.in_(sorted(ids)))
+    ).fetchall()
+
+    if not routing.may_cache(session):
+      # Relidos novamente na próxima busca
+      with self.__lock:
+        self.__stale.update(ids)
+
+    found = {id: _weights(name, description) for id, name, description in rows}
+    with self.__lock:
+      postings = self.__postings
+      if postings is None:
+        return
+
+      for id in ids:
+        postings.remove(id)
+        if id in found:
+          postings.add(id, found[id])
+
+      if postings.size > self.max_postings:
+        LOGGER.error("Search index exceeds %d postings, search disabled", self.max_postings)
+        self.__postings = None
+
+index = SearchIndex(Config.SEARCH_PREFIX_EXPANSIONS, Config.SEARCH_INDEX_MAX_POSTINGS, Config.SEARCH_INDEX_MAX_AGE)
+cache.add_invalidation_listener(index.invalidate)
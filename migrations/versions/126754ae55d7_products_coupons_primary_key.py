@@ -0,0 +1,53 @@
+"""products_coupons primary key and reverse index.
+
+Revision ID: 126754ae55d7
+Revises: 1b619dc30e73
+Create Date: 2026-10-18 17:05:12.412871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '126754ae55d7'
+down_revision = '1b619dc30e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove as associações incompletas e as duplicadas antes de criar a chave primária
+    op.execute('DELETE FROM products_coupons WHERE product_id IS NULL OR coupon_id IS NULL')
+    op.create_table('products_coupons_dedup',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('coupon_id', sa.Integer(), nullable=False)
+    )
+    op.execute(
+        'INSERT INTO products_coupons_dedup (product_id, coupon_id) '
+        'SELECT DISTINCT product_id, coupon_id FROM products_coupons'
+    )
+    op.execute('DELETE FROM products_coupons')
+    op.execute(
+        'INSERT INTO products_coupons (product_id, coupon_id) '
+        'SELECT product_id, coupon_id FROM products_coupons_dedup'
+    )
+    op.drop_table('products_coupons_dedup')
+
+    op.alter_column('products_coupons', 'product_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('products_coupons', 'coupon_id', existing_type=sa.Integer(), nullable=False)
+    op.create_primary_key('pk_products_coupons', 'products_coupons', ['product_id', 'coupon_id'])
+    op.create_index(
+        'ix_products_coupons_coupon_id_product_id', 'products_coupons', ['coupon_id', 'product_id'], unique=False
+    )
+
+
+def downgrade():
+    # O MySQL exige um índice para cada foreign key, então os índices simples
+    # são recriados antes de remover a chave primária e o índice reverso.
+    op.create_index('ix_products_coupons_coupon_id', 'products_coupons', ['coupon_id'], unique=False)
+    op.drop_index('ix_products_coupons_coupon_id_product_id', table_name='products_coupons')
+    op.create_index('ix_products_coupons_product_id', 'products_coupons', ['product_id'], unique=False)
+    op.drop_constraint('pk_products_coupons', 'products_coupons', type_='primary')
+    op.alter_column('products_coupons', 'coupon_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('products_coupons', 'product_id', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,40 @@
+"""product effective price.
+
+Revision ID: 4e8b1a6c2d95
+Revises: 9c2d41f7a0b3
+Create Date: 2026-10-18 21:05:12.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b1a6c2d95'
+down_revision = '9c2d41f7a0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('product', sa.Column('effective_price', sa.DECIMAL(precision=15, scale=2), nullable=True))
+    # Mesma regra de `ecommerce_api.model.effective_price`
+    op.execute("""
+        UPDATE product SET effective_price = price - COALESCE((
+            SELECT MAX(LEAST(product.price, GREATEST(
+                ROUND(product.price * COALESCE(coupon.discount_percent, 0) / 100, 2),
+                COALESCE(coupon.discount_value, 0)
+            )))
+            FROM products_coupons
+            JOIN coupon ON coupon.id = products_coupons.coupon_id
+            WHERE products_coupons.product_id = product.id
+        ), 0)
+    """)
+    op.alter_column('product', 'effective_price', existing_type=mysql.DECIMAL(precision=15, scale=2), nullable=False)
+    op.create_index(op.f('ix_product_effective_price'), 'product', ['effective_price'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_product_effective_price'), table_name='product')
+    op.drop_column('product', 'effective_price')
@@ -0,0 +1,31 @@
+"""audit datetime microseconds.
+
+Revision ID: 6a0e93b4f1c7
+Revises: d31f5c8e7b20
+Create Date: 2026-10-18 23:52:18.406931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0e93b4f1c7'
+down_revision = 'd31f5c8e7b20'
+branch_labels = None
+depends_on = None
+
+TABLES = ('coupon', 'product', 'user')
+
+
+def upgrade():
+    for table in TABLES:
+        op.alter_column(table, 'created_at', existing_type=mysql.DATETIME(), type_=mysql.DATETIME(fsp=6), existing_nullable=False)
+        op.alter_column(table, 'updated_at', existing_type=mysql.DATETIME(), type_=mysql.DATETIME(fsp=6), existing_nullable=True)
+
+
+def downgrade():
+    for table in TABLES:
+        op.alter_column(table, 'created_at', existing_type=mysql.DATETIME(fsp=6), type_=mysql.DATETIME(), existing_nullable=False)
+        op.alter_column(table, 'updated_at', existing_type=mysql.DATETIME(fsp=6), type_=mysql.DATETIME(), existing_nullable=True)
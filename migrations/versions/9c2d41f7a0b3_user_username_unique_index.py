@@ -0,0 +1,25 @@
+"""user username unique index.
+
+Revision ID: 9c2d41f7a0b3
+Revises: 126754ae55d7
+Create Date: 2026-10-18 18:12:40.118325
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2d41f7a0b3'
+down_revision = '126754ae55d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Falha caso existam usernames duplicados, que devem ser resolvidos manualmente
+    op.create_index(op.f('ix_user_username'), 'user', ['username'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_user_username'), table_name='user')
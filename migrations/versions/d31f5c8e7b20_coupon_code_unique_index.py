@@ -0,0 +1,25 @@
+"""coupon code unique index.
+
+Revision ID: d31f5c8e7b20
+Revises: 4e8b1a6c2d95
+Create Date: 2026-10-18 22:41:07.315842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd31f5c8e7b20'
+down_revision = '4e8b1a6c2d95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Falha caso existam códigos duplicados, que devem ser resolvidos manualmente
+    op.create_index(op.f('ix_coupon_code'), 'coupon', ['code'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_coupon_code'), table_name='coupon')
@@ -0,0 +1,6 @@
+import os
+
+# `Config` lê o ambiente na importação
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('PASSWORD_SALT', 'test-salt')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
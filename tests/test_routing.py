@@ -0,0 +1,101 @@
+from datetime import datetime
+from decimal import Decimal
+
+import jwt
+import pytest
+
+from ecommerce_api import routing
+from ecommerce_api.app import create_app
+from ecommerce_api.config import Config
+from ecommerce_api.model import Product
+from ecommerce_api.resources import db
+
+
+def _headers(user_id):
+    token = jwt.encode({'id': user_id, 'username': 'user%d' % user_id}, Config.SECRET_KEY, algorithm='HS256')
+    return {'Authorization': 'Bearer ' + token.decode('utf-8')}
+
+
+def _insert(engine, name):
+    engine.execute(Product.__table__.insert(), {
+        'name': name, 'price': Decimal('1'), 'effective_price': Decimal('1'),
+        'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow(),
+    })
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///%s' % (tmp_path / 'primary.db')
+    app.config['SQLALCHEMY_BINDS'] = {'replica_0': 'sqlite:///%s' % (tmp_path / 'replica.db')}
+    for option in ('SQLALCHEMY_POOL_SIZE', 'SQLALCHEMY_MAX_OVERFLOW', 'SQLALCHEMY_POOL_TIMEOUT'):
+        app.config[option] = None
+
+    # Os dois bancos têm o mesmo schema e conteúdos diferentes, para identificar a origem das leituras
+    with app.app_context():
+        for bind, name in ((None, 'primary'), ('replica_0', 'replica')):
+            engine = db.get_engine(app, bind=bind)
+            db.Model.metadata.create_all(engine)
+            _insert(engine, name)
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+
+
+def _names(client, headers):
+    response = client.get('/v1/product?fields=name&order=id', headers=headers)
+    assert response.status_code == 200
+    return [product['name'] for product in response.json['objects']]
+
+
+def test_get_reads_from_replica(app):
+    assert _names(app.test_client(), _headers(1)) == ['replica']
+
+
+def test_write_pins_session_to_primary(app):
+    with app.test_request_context('/v1/product', method='GET'):
+        assert [product.name for product in Product.query.order_by(Product.id)] == ['replica']
+        assert routing.replica_of(db.session) == 'replica_0'
+
+        db.session.add(Product(name='new', price=Decimal('2')))
+        db.session.flush()
+
+        assert [product.name for product in Product.query.order_by(Product.id)] == ['primary', 'new']
+        db.session.rollback()
+
+
+def test_write_goes_to_primary_and_returns_marker(app):
+    response = app.test_client().post('/v1/product', headers=_headers(1), json={'name': 'new', 'price': 2})
+
+    assert response.status_code == 201
+    assert response.headers.get(Config.REPLICA_WRITE_MARKER)
+    with app.app_context():
+        primary = [row.name for row in db.get_engine(app).execute('SELECT name FROM product ORDER BY id')]
+        replica = [row.name for row in db.get_engine(app, bind='replica_0').execute('SELECT name FROM product')]
+    assert primary == ['primary', 'new']
+    assert replica == ['replica']
+
+
+def test_marker_header_reads_from_primary(app):
+    response = app.test_client().post('/v1/product', headers=_headers(1), json={'name': 'new', 'price': 2})
+    marker = response.headers[Config.REPLICA_WRITE_MARKER]
+
+    # Outros usuários (e processos): apenas o marcador leva a leitura ao primário
+    headers = dict(_headers(2), **{Config.REPLICA_WRITE_MARKER: marker})
+    assert _names(app.test_client(), headers) == ['primary', 'new']
+    assert _names(app.test_client(), _headers(3)) == ['replica']
+
+
+def test_marker_cookie_reads_from_primary(app):
+    client = app.test_client()
+    client.post('/v1/product', headers=_headers(1), json={'name': 'new', 'price': 2})
+
+    # O cookie volta pelo mesmo cliente, autenticado como outro usuário
+    assert _names(client, _headers(4)) == ['primary', 'new']
+
+
+def test_expired_marker_reads_from_replica(app):
+    headers = dict(_headers(5), **{Config.REPLICA_WRITE_MARKER: '1000.000'})
+    assert _names(app.test_client(), headers) == ['replica']
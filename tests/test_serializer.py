@@ -0,0 +1,110 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from ecommerce_api.api import serializer
+from ecommerce_api.api.rest.schema.coupon import CouponSchema
+from ecommerce_api.api.rest.schema.product import ProductSchema
+from ecommerce_api.api.rest.schema.user import UserSchema
+from ecommerce_api.model import Coupon, Product, User
+
+CREATED = datetime(2020, 5, 17, 10, 30, 15, 123456)
+UPDATED = datetime(2021, 1, 2, 3, 4, 5)
+
+
+def _coupon(id, **kwargs):
+    values = dict(
+        id=id, code='CODE%d' % id, discount_percent=Decimal('10.5'), discount_value=None,
+        created_at=CREATED, updated_at=UPDATED,
+    )
+    values.update(kwargs)
+    return Coupon(**values)
+
+
+def _product(id, coupons=(), **kwargs):
+    values = dict(
+        id=id, name='Produto %d' % id, description='Descrição', price=Decimal('19.90'),
+        effective_price=Decimal('17.81'), created_at=CREATED, updated_at=UPDATED,
+    )
+    values.update(kwargs)
+    product = Product(**values)
+    product.coupons = list(coupons)
+    return product
+
+
+def _assert_same(schema, data):
+    assert serializer.compiled(schema) is not None
+    assert serializer.dump(schema, data) == schema.dump(data)
+
+
+@pytest.mark.parametrize('schema', [ProductSchema(), CouponSchema(), UserSchema()])
+def test_schemas_are_compiled(schema):
+    assert serializer.compiled(schema) is not None
+
+
+def test_product():
+    coupons = [_coupon(1), _coupon(2, discount_percent=None, discount_value=Decimal('5'))]
+    _assert_same(ProductSchema(), _product(1, coupons))
+
+
+def test_product_many_with_nested_many():
+    products = [
+        _product(1, [_coupon(1), _coupon(2)]),
+        _product(2),
+        _product(3, [_coupon(3, code='')]),
+    ]
+    _assert_same(ProductSchema(many=True), products)
+
+
+def test_product_none_values():
+    product = _product(1, [_coupon(1, discount_percent=None)], description=None, updated_at=None)
+    _assert_same(ProductSchema(), product)
+    assert serializer.dump(ProductSchema(), product)['description'] is None
+
+
+def test_product_missing_attributes():
+    product = SimpleNamespace(id=1, name='Produto', price=Decimal('1.00'), coupons=[SimpleNamespace(id=2)])
+    result = serializer.dump(ProductSchema(), product)
+
+    _assert_same(ProductSchema(), product)
+    assert 'description' not in result
+    assert result['coupons'] == [{'id': 2}]
+
+
+@pytest.mark.parametrize('only', [
+    ('id',),
+    ('id', 'name', 'price'),
+    ('id', 'coupons'),
+    ('id', 'coupons.code'),
+    ('coupons.id', 'coupons.discount_value'),
+])
+def test_product_only(only):
+    products = [_product(1, [_coupon(1), _coupon(2)]), _product(2)]
+    _assert_same(ProductSchema(many=True, only=only), products)
+
+
+def test_coupon():
+    coupon = _coupon(1, products=[_product(1), _product(2, description=None)])
+    _assert_same(CouponSchema(), coupon)
+
+
+def test_coupon_many_only():
+    coupons = [_coupon(1, products=[_product(1)]), _coupon(2)]
+    _assert_same(CouponSchema(many=True, only=('code', 'products.name')), coupons)
+
+
+def test_user():
+    user = User(id=1, username='user', password='hash', created_at=CREATED, updated_at=None)
+    _assert_same(UserSchema(), user)
+    _assert_same(UserSchema(only=('id', 'username')), user)
+
+
+def test_user_missing_attributes():
+    _assert_same(UserSchema(many=True), [SimpleNamespace(username='user'), SimpleNamespace()])
+
+
+def test_dict_uses_marshmallow():
+    data = {'id': '1', 'name': 'Produto', 'price': '1.5'}
+    assert serializer.dump(ProductSchema(), data) == ProductSchema().dump(data)